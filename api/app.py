@@ -0,0 +1,204 @@
+"""
+Сервис чтения вакансий.
+
+Запуск:
+python -m api.app
+
+GET /vacancies - вакансии от самых свежих к более ранним. Параметры запроса:
+salary_from, salary_to - зарплата от не меньше и зарплата до не больше,
+city, format, company - точное совпадение,
+date_from, date_to - дата размещения (ISO 8601 без смещения от UTC), date_from включительно,
+q - полнотекстовый поиск по заголовку и описанию,
+limit - количество вакансий на странице,
+after - значение next из предыдущего ответа.
+Ответ: {"items": [...], "next": позиция следующей страницы либо null}.
+
+GET /health - состояние кеша ответов.
+"""
+import asyncio
+import json
+from datetime import datetime
+
+import psycopg2
+from aiohttp import web
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+import settings
+from api.cache import QueryCache
+from db.database import DataBase
+from db.pool import connection_params
+from logger import write_logs
+
+
+class ChangeListener:
+    """
+    Подписка на канал DataBase.changes_channel (LISTEN), по сообщениям которого
+    из кеша удаляются ответы, затронутые новыми вакансиями.
+
+    Принимает:
+    кеш ответов,
+    логгер.
+
+    Уведомления читаются из цикла событий (loop.add_reader), без отдельного потока.
+    Если соединение оборвалось, кеш очищается целиком, а подписка восстанавливается
+    через reconnect_delay секунд.
+    """
+    reconnect_delay = 5  # пауза перед повторным подключением, в секундах
+
+    def __init__(self, cache, logger):
+        self.cache = cache
+        self.logger = logger
+        self.conn = None
+        self.fd = None  # дескриптор соединения, зарегистрированный в цикле событий
+        self.loop = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        try:
+            self.conn = psycopg2.connect(**connection_params())
+            self.conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with self.conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {DataBase.changes_channel}')
+        except psycopg2.Error as e:
+            self.logger.error('Not listening for changes: %s', e)
+            self.conn = None
+            self.loop.call_later(self.reconnect_delay, self.start)
+            return
+        self.fd = self.conn.fileno()
+        self.loop.add_reader(self.fd, self.poll)
+
+    def poll(self):
+        try:
+            self.conn.poll()
+        except psycopg2.Error as e:
+            self.logger.error('Change listener disconnected: %s', e)
+            self.cache.clear()
+            self.stop()
+            self.loop.call_later(self.reconnect_delay, self.start)
+            return
+        while self.conn.notifies:
+            notify = self.conn.notifies.pop(0)
+            low, high = (datetime.fromisoformat(value) for value in notify.payload.split('|'))
+            self.cache.invalidate(low, high)
+
+    def stop(self):
+        # после обрыва соединение уже закрыто, но его дескриптор все еще зарегистрирован в цикле событий
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            self.fd = None
+        if self.conn is None:
+            return
+        if not self.conn.closed:
+            self.conn.close()
+        self.conn = None
+
+
+class VacancyService:
+    """
+    HTTP-сервис чтения вакансий с фильтрами, постраничной выдачей по ключу (date, id)
+    и кешем повторяющихся запросов.
+
+    Принимает:
+    базу данных,
+    кеш ответов (по умолчанию QueryCache с настройками из settings),
+    логгер.
+
+    Запросы к базе данных выполняются в пуле потоков, чтобы не блокировать цикл событий.
+    """
+    int_filters = ('salary_from', 'salary_to')
+    text_filters = ('city', 'format', 'company', 'q')
+    date_filters = ('date_from', 'date_to')
+
+    def __init__(self, db=None, cache=None, logger=None):
+        self.logger = logger or write_logs(self.__class__)
+        self.db = db or DataBase()
+        self.cache = cache or QueryCache(settings.API_CACHE_SIZE, settings.API_CACHE_TTL)
+        self.listener = ChangeListener(self.cache, self.logger)
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_get('/vacancies', self.search)
+        app.router.add_get('/health', self.health)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+    async def on_startup(self, app):
+        self.listener.start()
+
+    async def on_cleanup(self, app):
+        self.listener.stop()
+
+    def parse_query(self, query):
+        """
+        Принимает:
+        параметры запроса.
+
+        Возвращает:
+        словарь фильтров, позицию (дата, id), после которой нужны вакансии, и размер страницы.
+        При неверном значении параметра вызывает ValueError.
+        """
+        filters = {}
+        for name in self.int_filters:
+            if name in query:
+                filters[name] = int(query[name])
+        for name in self.text_filters:
+            if query.get(name):
+                filters[name] = query[name]
+        for name in self.date_filters:
+            if name in query:
+                filters[name] = self.parse_date(query[name])
+        after = None
+        if query.get('after'):
+            date, vacancy_id = query['after'].rsplit(',', 1)
+            after = (self.parse_date(date), int(vacancy_id))
+        limit = int(query.get('limit', settings.API_PAGE_SIZE))
+        if not 0 < limit <= settings.API_MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {settings.API_MAX_PAGE_SIZE}')
+        return filters, after, limit
+
+    @staticmethod
+    def parse_date(value):
+        """
+        Разбирает дату ISO 8601. Даты вакансий хранятся без часового пояса,
+        поэтому дата со смещением от UTC не принимается (ValueError): иначе ее
+        нельзя сравнить с датами уведомлений при сбросе кеша.
+        """
+        date = datetime.fromisoformat(value)
+        if date.tzinfo is not None:
+            raise ValueError(f'date must not include a UTC offset: {value}')
+        return date
+
+    async def search(self, request):
+        try:
+            filters, after, limit = self.parse_query(request.query)
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        key = (tuple(sorted(filters.items())), after, limit)
+        body = self.cache.get(key)
+        if body is None:
+            # уведомление, пришедшее во время запроса, могло сделать его результат устаревшим
+            generation = self.cache.generation
+            loop = asyncio.get_running_loop()
+            items = await loop.run_in_executor(None, self.db.search_vacancies, filters, after, limit)
+            full = len(items) == limit
+            next_page = f"{items[-1]['date'].isoformat()},{items[-1]['id']}" if full else None
+            body = json.dumps({'items': items, 'next': next_page}, default=str, ensure_ascii=False)
+            # ответ зависит от вакансий с датами от последней вакансии полной страницы
+            # (либо date_from) до позиции after (либо date_to)
+            low = items[-1]['date'] if full else filters.get('date_from')
+            high = after[0] if after else filters.get('date_to')
+            if self.cache.generation == generation:
+                self.cache.set(key, body, low, high)
+        return web.Response(text=body, content_type='application/json')
+
+    async def health(self, request):
+        return web.json_response({'cache': self.cache.stats(), 'listening': self.listener.conn is not None})
+
+
+def main():
+    web.run_app(VacancyService().create_app(), host=settings.API_HOST, port=settings.API_PORT)
+
+
+if __name__ == '__main__':
+    main()
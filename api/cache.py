@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    Кеш ответов сервиса чтения с ограничением размера (LRU) и времени жизни (TTL).
+
+    Принимает:
+    максимальное количество ответов,
+    время жизни ответа в секундах.
+
+    Назначение:
+    не выполнять повторно одинаковые запросы к базе данных.
+    Вместе с ответом хранится диапазон дат вакансий, от которых он зависит
+    (low, high; None - без ограничения). Когда в базу данных добавляются вакансии,
+    invalidate удаляет только ответы, диапазон которых пересекается с датами новых вакансий:
+    страницы прошлых месяцев остаются в кеше во время записи свежих вакансий.
+    Каждый сброс увеличивает generation: ответ, запрошенный до сброса,
+    не нужно класть в кеш после него (см. VacancyService.search).
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # ключ -> (время истечения, low, high, ответ)
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.generation = 0  # количество сбросов кеша
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[3]
+
+    def set(self, key, value, low=None, high=None):
+        self.entries[key] = (time.monotonic() + self.ttl, low, high, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, low, high):
+        """
+        Удаляет ответы, которые могли измениться после добавления вакансий с датами от low до high.
+        """
+        stale = [key for key, (_, entry_low, entry_high, _) in self.entries.items()
+                 if (entry_low is None or entry_low <= high) and (entry_high is None or entry_high >= low)]
+        for key in stale:
+            del self.entries[key]
+        self.invalidated += len(stale)
+        self.generation += 1
+
+    def clear(self):
+        self.invalidated += len(self.entries)
+        self.generation += 1
+        self.entries.clear()
+
+    def stats(self):
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidated': self.invalidated,
+        }
@@ -0,0 +1,82 @@
+"""
+Сравнение скорости записи вакансий в базу данных.
+
+Сравниваются два способа:
+legacy - как было раньше: CREATE TABLE IF NOT EXISTS и INSERT на каждую вакансию
+         (в отдельную таблицу прежнего вида vacancies_benchmark),
+batch  - DataBase.write_many, многострочный INSERT пакетами по одной странице.
+
+Запуск:
+python -m benchmarks.db_write -rows 5000 -batch 100
+"""
+import argparse
+import time
+from datetime import datetime
+
+from db.database import DataBase
+from vacancy_parser.vacancy import Vacancy
+
+
+PREFIX = 'https://benchmark.local/'
+LEGACY_TABLE = 'vacancies_benchmark'
+
+
+def make_records(rows, tag):
+    now = datetime.now()
+    return [Vacancy(i, 100000, 150000, 'RUB', 'Москва', f'{PREFIX}{tag}/{i}',
+                    'Описание вакансии ' * 10, 'Компания', 'Python разработчик',
+                    'Полный день', now) for i in range(rows)]
+
+
+def legacy_write(db, records):
+    with db.pool.connection() as conn:
+        conn.autocommit = True  # как в старой реализации: каждый запрос - отдельная транзакция
+        with conn.cursor() as cursor:
+            for record in records:
+                cursor.execute(f"""CREATE TABLE IF NOT EXISTS {LEGACY_TABLE} (
+                               id SERIAL PRIMARY KEY, vacancy_id INT, salary_from INT, salary_to INT,
+                               curr TEXT, areas TEXT, url TEXT UNIQUE, description TEXT, company TEXT,
+                               title TEXT, format TEXT, date TIMESTAMP);""")
+                cursor.execute(f"""INSERT INTO {LEGACY_TABLE}(
+                vacancy_id, salary_from, salary_to, curr, areas, url, description, company, title, format, date)
+                VALUES(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT(url) DO NOTHING""", record)
+        conn.autocommit = False
+
+
+def batch_write(db, records, batch):
+    for i in range(0, len(records), batch):
+        db.write_many(records[i:i + batch])
+
+
+def measure(name, func, rows):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f'{name:>6}: {rows} строк за {elapsed:.2f} с, {rows / elapsed:.0f} строк/с')
+    return elapsed
+
+
+def main(rows, batch):
+    db = DataBase()
+    try:
+        legacy = make_records(rows, 'legacy')
+        batched = make_records(rows, 'batch')
+        legacy_time = measure('legacy', lambda: legacy_write(db, legacy), rows)
+        batch_time = measure('batch', lambda: batch_write(db, batched, batch), rows)
+        print(f'Ускорение: x{legacy_time / batch_time:.1f}')
+    finally:
+        def clean(cursor):
+            cursor.execute(f'DROP TABLE IF EXISTS {LEGACY_TABLE}')
+            cursor.execute('DELETE FROM vacancies WHERE url LIKE %s', (PREFIX + '%',))
+            cursor.execute('DELETE FROM vacancy_urls WHERE url LIKE %s', (PREFIX + '%',))
+
+        db.run(clean)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-rows', type=int, default=5000)
+    parser.add_argument('-batch', type=int, default=100)
+    args = parser.parse_args()
+    main(args.rows, args.batch)
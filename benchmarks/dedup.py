@@ -0,0 +1,140 @@
+"""
+Поиск дубликатов вакансий (db.dedup) на синтетических данных.
+
+Генерируется rows вакансий: каждая исходная вакансия размещается на одном-трех сайтах,
+копии отличаются разметкой, регистром, знаками препинания и последним предложением описания.
+Вакансии обрабатываются Deduplicator пачками, как новые строки таблицы vacancies,
+а таблицы vacancy_groups и vacancy_buckets хранятся в памяти.
+
+С параметром -identical часть вакансий - копии одной массовой вакансии: так проверяется,
+что количество сравнений не растет квадратично с размером одной группы.
+
+Выводится скорость обработки, количество сравнений сигнатур (против n * (n - 1) / 2
+при попарном сравнении) и точность и полнота найденных пар дубликатов.
+
+Запуск:
+python -m benchmarks.dedup -rows 20000
+python -m benchmarks.dedup -rows 20000 -identical 4
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+from itertools import combinations
+
+from db.dedup import Deduplicator
+
+
+WORDS = ('python', 'разработчик', 'backend', 'опыт', 'коммерческой', 'разработки', 'знание', 'postgresql',
+         'asyncio', 'django', 'flask', 'docker', 'kubernetes', 'linux', 'git', 'sql', 'rest', 'api', 'очереди',
+         'сообщений', 'kafka', 'rabbitmq', 'redis', 'тестирование', 'pytest', 'код', 'ревью', 'команда',
+         'проект', 'архитектура', 'высоконагруженных', 'сервисов', 'микросервисы', 'аналитика', 'данные',
+         'машинное', 'обучение', 'офис', 'удаленно', 'гибкий', 'график', 'дмс', 'английский', 'язык')
+TITLES = ('Python разработчик', 'Backend-разработчик', 'Senior Python Developer', 'Инженер данных',
+          'Разработчик Django', 'Team Lead Python', 'Data Engineer', 'Middle Python разработчик')
+COMPANIES = [f'Компания {i}' for i in range(500)]
+
+
+class MemoryDataBase:
+    """
+    Таблицы vacancy_groups и vacancy_buckets в памяти с тем же интерфейсом, что и у DataBase.
+    """
+
+    def __init__(self, vacancies):
+        self.vacancies = vacancies  # список (id, title, company, description) в порядке id
+        self.groups = {}  # id -> (group_id, сигнатура)
+        self.buckets = defaultdict(list)  # (полоса, корзина) -> список id
+
+    def get_dedup_batch(self, after_id, limit, since=None):
+        return [row for row in self.vacancies if row[0] > after_id and row[0] not in self.groups][:limit]
+
+    def get_dedup_mark(self, settle_minutes):
+        return None, None
+
+    def set_dedup_mark(self, mark):
+        pass
+
+    def get_dedup_candidates(self, keys):
+        found = defaultdict(list)  # id -> корзины из keys
+        for band, bucket in keys:
+            for vacancy_id in self.buckets.get((band, bucket), ()):
+                found[vacancy_id].append((band, bucket))
+        return [(vacancy_id, *self.groups[vacancy_id], row_keys) for vacancy_id, row_keys in found.items()]
+
+    def write_dedup(self, groups, buckets):
+        for vacancy_id, group_id, signature in groups:
+            self.groups[vacancy_id] = (group_id, signature)
+        for band, bucket, vacancy_id in buckets:
+            self.buckets[band, bucket].append(vacancy_id)
+
+
+def make_vacancies(rows, identical=0, seed=1):
+    """
+    Возвращает вакансии (id, title, company, description) и номер исходной вакансии для каждого id.
+    Каждая identical-я вакансия - одна и та же массовая вакансия (например, курьер во всех городах):
+    все ее копии попадают в одни и те же корзины LSH.
+    """
+    rng = random.Random(seed)
+    vacancies, origin = [], {}
+    source = 1
+    mass = ('Курьер', 'Компания доставки', ' '.join(WORDS[:30]))
+    while len(vacancies) < rows:
+        if identical and rng.random() < 1 / identical:
+            vacancy_id = len(vacancies) + 1
+            vacancies.append((vacancy_id, *mass))
+            origin[vacancy_id] = 0
+            continue
+        title, company = rng.choice(TITLES), rng.choice(COMPANIES)
+        description = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(25, 40)))
+        for _ in range(rng.choice((1, 1, 2, 3))):
+            copy = description
+            if rng.random() < 0.5:
+                copy = copy.replace('python', '<highlighttext>Python</highlighttext>', 1)
+            if rng.random() < 0.5:
+                copy = copy.capitalize() + '.'
+            copy += ' ' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 3)))
+            vacancy_id = len(vacancies) + 1
+            vacancies.append((vacancy_id, title.upper() if rng.random() < 0.2 else title, company, copy))
+            origin[vacancy_id] = source
+        source += 1
+    vacancies = vacancies[:rows]
+    return vacancies, {vacancy_id: origin[vacancy_id] for vacancy_id, *_ in vacancies}
+
+
+def pairs(labels):
+    """
+    Возвращает множество пар id, у которых одинаковая метка (группа либо исходная вакансия).
+    """
+    members = defaultdict(list)
+    for vacancy_id, label in labels.items():
+        members[label].append(vacancy_id)
+    return {pair for ids in members.values() for pair in combinations(sorted(ids), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-rows', type=int, default=20000)
+    parser.add_argument('-batch', type=int, default=5000)
+    parser.add_argument('-threshold', type=float, default=0.7)
+    parser.add_argument('-workers', type=int, default=1)
+    parser.add_argument('-identical', type=int, default=0,
+                        help='доля одинаковых вакансий: каждая identical-я (0 - без них)')
+    args = parser.parse_args()
+    vacancies, origin = make_vacancies(args.rows, args.identical)
+    db = MemoryDataBase(vacancies)
+    dedup = Deduplicator(db, num_perm=64, bands=16, threshold=args.threshold, batch_size=args.batch,
+                         workers=args.workers)
+    started = time.perf_counter()
+    report = dedup.run()
+    elapsed = time.perf_counter() - started
+    found = pairs({vacancy_id: group_id for vacancy_id, (group_id, _) in db.groups.items()})
+    expected = pairs(origin)
+    matched = len(found & expected)
+    print(f'{args.rows} вакансий за {elapsed:.1f} с, {args.rows / elapsed:.0f} вакансий/с')
+    print(f"сравнений сигнатур: {report['comparisons']}, попарно: {args.rows * (args.rows - 1) // 2}")
+    print(f"дубликатов: {report['duplicates']}, пар: найдено {len(found)}, ожидалось {len(expected)}, "
+          f'точность {matched / len(found) if found else 1:.3f}, полнота {matched / len(expected) if expected else 1:.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Память, которую занимают вакансии, ожидающие записи в базу данных.
+
+Генерируется набор страниц ответа API hh.ru (по 100 вакансий со структурой реального ответа),
+каждая страница разбирается из json, как в Parser.fetch, и кладется в очередь на запись
+одним из способов:
+raw     - ответ API целиком (разбор откладывается до записи),
+tuples  - прежний способ: обычные кортежи из 11 полей,
+vacancy - Vacancy, полученные через ParserHH.extract (как в Parser.write_page).
+
+Очередь не разгружается, как при медленной базе данных, поэтому пиковая память
+показывает, сколько стоит каждая ожидающая вакансия.
+
+Запуск:
+python -m benchmarks.memory -pages 2000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+
+ITEM = {
+    'id': '0', 'premium': False, 'name': 'Python разработчик', 'department': None, 'has_test': False,
+    'response_letter_required': False, 'area': {'id': '1', 'name': 'Москва', 'url': 'https://api.hh.ru/areas/1'},
+    'salary': {'from': 150000, 'to': 250000, 'currency': 'RUR', 'gross': False},
+    'type': {'id': 'open', 'name': 'Открытая'},
+    'address': {'city': 'Москва', 'street': 'улица Льва Толстого', 'building': '16', 'lat': 55.73, 'lng': 37.58,
+                'metro': {'station_name': 'Парк культуры', 'line_name': 'Сокольническая', 'lat': 55.73,
+                          'lng': 37.59}},
+    'response_url': None, 'sort_point_distance': None, 'published_at': '', 'created_at': '', 'archived': False,
+    'apply_alternate_url': 'https://hh.ru/applicant/vacancy_response?vacancyId=0', 'insider_interview': None,
+    'url': 'https://api.hh.ru/vacancies/0?host=hh.ru', 'alternate_url': '',
+    'relations': [], 'employer': {'id': '1740', 'name': 'Яндекс', 'url': 'https://api.hh.ru/employers/1740',
+                                  'alternate_url': 'https://hh.ru/employer/1740',
+                                  'logo_urls': {'90': 'https://hhcdn.ru/employer-logo/1.png',
+                                                '240': 'https://hhcdn.ru/employer-logo/2.png',
+                                                'original': 'https://hhcdn.ru/employer-logo-original/3.png'},
+                                  'vacancies_url': 'https://api.hh.ru/vacancies?employer_id=1740', 'trusted': True},
+    'snippet': {'requirement': 'Опыт коммерческой разработки на <highlighttext>Python</highlighttext> от 3 лет. '
+                               'Знание PostgreSQL, asyncio, опыт работы с очередями сообщений.',
+                'responsibility': 'Разработка и поддержка высоконагруженных сервисов, код-ревью, '
+                                  'участие в проектировании архитектуры.'},
+    'contacts': None, 'schedule': {'id': 'remote', 'name': 'Удаленная работа'}, 'working_days': [],
+    'working_time_intervals': [], 'working_time_modes': [], 'accept_temporary': False,
+}
+
+
+def make_page(page, per_page, start):
+    """
+    Возвращает json-текст страницы ответа API с уникальными id, url и датами вакансий.
+    """
+    items = []
+    for i in range(per_page):
+        number = page * per_page + i
+        item = dict(ITEM)
+        item['id'] = str(number)
+        item['alternate_url'] = f'https://hh.ru/vacancy/{number}'
+        item['published_at'] = (start + timedelta(seconds=number)).isoformat() + '+0300'
+        items.append(item)
+    return json.dumps({'items': items, 'found': per_page, 'pages': 1, 'per_page': per_page, 'page': page},
+                      ensure_ascii=False)
+
+
+def to_tuples(parser, items):
+    return [tuple(parser.extract(item)) for item in items]
+
+
+def to_vacancies(parser, items):
+    return [parser.extract(item) for item in items]
+
+
+def measure(mode, pages, per_page):
+    from vacancy_parser.parseHH import ParserHH
+
+    parser = ParserHH.__new__(ParserHH)  # extract не использует состояние парсера
+    start = datetime(2026, 1, 1)
+    texts = [make_page(page, per_page, start) for page in range(pages)]
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    backlog = []  # пакеты, ожидающие записи
+    for text in texts:
+        resp = json.loads(text)
+        if mode == 'raw':
+            backlog.append(resp)
+        elif mode == 'tuples':
+            backlog.append(to_tuples(parser, resp['items']))
+        else:
+            backlog.append(to_vacancies(parser, resp['items']))
+        del resp
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows = pages * per_page
+    return {
+        'mode': mode,
+        'rows': rows,
+        'seconds': round(elapsed, 2),
+        'retained_mb': round(current / 2 ** 20, 1),
+        'peak_mb': round(peak / 2 ** 20, 1),
+        'bytes_per_row': round(current / rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-pages', type=int, default=2000)
+    parser.add_argument('-per-page', dest='per_page', type=int, default=100)
+    parser.add_argument('-modes', nargs='+', default=['raw', 'tuples', 'vacancy'])
+    args = parser.parse_args()
+    columns = ('mode', 'rows', 'seconds', 'retained_mb', 'peak_mb', 'bytes_per_row')
+    print(' '.join(f'{column:>14}' for column in columns))
+    for mode in args.modes:
+        report = measure(mode, args.pages, args.per_page)
+        print(' '.join(f'{str(report[column]):>14}' for column in columns))
+
+
+if __name__ == '__main__':
+    main()
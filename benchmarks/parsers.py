@@ -0,0 +1,133 @@
+"""
+Офлайн-бенчмарк парсеров на записанных ответах.
+
+Запись ответов сайтов в кассету (единственный запуск, которому нужна сеть):
+python -m benchmarks.parsers -record -sources hh sj rr -days 1
+
+Воспроизведение с задержкой 50 мс и 2% ответов 503:
+python -m benchmarks.parsers -sources hh sj rr -latency 0.05 -errors 0.02
+
+Для каждого парсера выводятся время работы, запросы в секунду и записанные строки в секунду.
+Вакансии не пишутся в PostgreSQL: вместо базы данных используется MemoryDataBase.
+"""
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime
+from functools import partial
+
+from db.seen import SeenFilter
+from vacancy_parser.rate_limit import RateLimiter
+from vacancy_parser.replay import Cassette, ReplaySession
+from vacancy_parser.vacancy import content_hash
+
+
+CASSETTES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cassettes')
+
+
+class MemoryDataBase:
+    """
+    База данных в памяти с тем же интерфейсом записи, что и у DataBase.
+    Повторные url не добавляются, а обновляются, только если изменилось содержимое вакансии.
+    """
+
+    def __init__(self):
+        self.urls = {}  # url -> хеш содержимого
+        self.dead_letters = []
+
+    def write_many(self, records):
+        inserted = updated = 0
+        for record in records:
+            digest = content_hash(record)
+            stored = self.urls.get(record.url)
+            if stored is None:
+                inserted += 1
+            elif stored != digest:
+                updated += 1
+            self.urls[record.url] = digest
+        return inserted, updated
+
+    def get_urls(self, since, after_id=0, before=None):
+        return iter(())
+
+    def get_last_id(self):
+        return None
+
+    def get_watermark(self, source):
+        return None
+
+    def set_watermark(self, source, published_at):
+        pass
+
+    def write_dead_letters(self, source, failed):
+        self.dead_letters.extend(failed)
+
+
+def get_parsers():
+    from vacancy_parser.orchestrator import PARSERS
+    return PARSERS
+
+
+async def record(source, days):
+    cassette = Cassette(os.path.join(CASSETTES, source))
+    parser = get_parsers()[source](days=days, db=MemoryDataBase(), cassette=cassette, seen=SeenFilter())
+    await parser.start_parse()
+    return parser.report()
+
+
+async def replay(source, latency, jitter, errors, throttle, rate_limit):
+    cassette = Cassette(os.path.join(CASSETTES, source))
+    meta = cassette.read_meta()
+    time_to = datetime.fromisoformat(meta['time_to'])
+    period = time_to - datetime.fromisoformat(meta['time_end'])
+    parser = get_parsers()[source](minutes=period.total_seconds() / 60, time_to=time_to,
+                                   db=MemoryDataBase(), seen=SeenFilter())
+    parser.session_factory = partial(ReplaySession, cassette, latency, jitter, errors, throttle)
+    if not rate_limit:
+        parser.limiter = RateLimiter(float('inf'), 10 ** 9)
+    await parser.start_parse()
+    report = parser.report()
+    report['bytes'] = parser.session.bytes
+    return report
+
+
+def print_reports(reports):
+    columns = ('source', 'duration', 'requests', 'retries', 'rows', 'failed', 'seen_hit_rate',
+               'requests_per_sec', 'rows_per_sec', 'peak_concurrency')
+    print(' '.join(f'{column:>16}' for column in columns))
+    for report in reports:
+        print(' '.join(f'{str(report[column]):>16}' for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-sources', nargs='+', default=['hh', 'sj', 'rr'])
+    parser.add_argument('-record', action='store_const', const=True, default=False,
+                        help='записать ответы сайтов в кассеты вместо воспроизведения')
+    parser.add_argument('-days', type=float, default=1, help='период поиска при записи, в днях')
+    parser.add_argument('-latency', type=float, default=0.0, help='задержка ответа, в секундах')
+    parser.add_argument('-jitter', type=float, default=0.0, help='случайный разброс задержки, в секундах')
+    parser.add_argument('-errors', type=float, default=0.0, help='доля ответов 503')
+    parser.add_argument('-throttle', type=float, default=0.0, help='доля ответов 429')
+    parser.add_argument('-rate-limit', dest='rate_limit', action='store_const', const=True, default=False,
+                        help='соблюдать ограничения частоты запросов из settings.RATE_LIMITS')
+    parser.add_argument('-json', action='store_const', const=True, default=False)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    reports = []
+    for source in args.sources:
+        if args.record:
+            run = record(source, args.days)
+        else:
+            run = replay(source, args.latency, args.jitter, args.errors, args.throttle, args.rate_limit)
+        reports.append(loop.run_until_complete(run))
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+    else:
+        print_reports(reports)
+
+
+if __name__ == '__main__':
+    main()
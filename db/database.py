@@ -1,48 +1,731 @@
-from psycopg2 import connect
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from datetime import timedelta
+
+from psycopg2 import InterfaceError, OperationalError
+from psycopg2.extras import execute_values
+
+from db.pool import get_pool
+from vacancy_parser.vacancy import CONTENT_FIELDS, Vacancy, content_hash
 
 
 class DataBase:
+    """
+    Класс для работы с базой данных PostgreSQL.
+
+    Принимает:
+    пул соединений (по умолчанию общий пул текущего процесса, см. db.pool.get_pool).
 
-    def __init__(self, user=None, password=None, host=None, port=None, db=None):
-        self.conn = connect(
-            user=user or 'postgres',
-            password=password or '1111',
-            host=host or 'localhost',
-            port=port or "5432",
-            database=db or "database"
-        )
-        self.conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-        self.cursor = self.conn.cursor()
+    Соединения берутся из пула на время запроса, поэтому экземпляры класса
+    дешевые и могут свободно создаваться парсерами и задачами Celery.
+    Если соединение оборвалось, запрос повторяется один раз на новом соединении.
+
+    Схема создается один раз за время жизни процесса
+    (при создании первого экземпляра класса), а не перед каждой записью.
+    Таблица vacancies секционирована по дате, см. create_table.
+    Изменения уже записанных вакансий сохраняются в таблицу vacancy_changes, см. write_many.
+    """
+    schema_created = False  # флаг создания таблицы в текущем процессе
+    page_size = 500  # количество строк в одном INSERT при пакетной записи
+    reconnect_attempts = 1  # количество повторов запроса при обрыве соединения
+    dead_letter_attempts = 10  # после стольких неудачных попыток окно больше не запрашивается
+    lease_attempts = 5  # после стольких неудачных аренд окно очереди больше не выдается
+    schema_lock = 7270001  # ключ advisory-блокировки на время изменения схемы
+    indexed_columns = ('date', 'company', 'title', 'areas', 'url')  # колонки vacancies с индексами b-tree
+    partitions = set()  # месяцы, для которых в текущем процессе уже созданы секции vacancies
+    changes_channel = 'vacancies_changed'  # канал NOTIFY о новых вакансиях, см. api.app
+    dedup_mark = 'dedup_mark'  # строка watermarks с границей обработанных поиском дубликатов вакансий
+    search_columns = ('id', 'vacancy_id', 'salary_from', 'salary_to', 'curr', 'areas', 'url',
+                      'description', 'company', 'title', 'format', 'date')  # колонки в ответе search_vacancies
+    # типы колонок для VALUES: без них колонка, в которой все значения NULL, считается текстовой
+    # последняя колонка - хеш содержимого вакансии (см. vacancy_parser.vacancy.content_hash)
+    record_template = '(%s::int, %s::int, %s::int, %s, %s, %s, %s, %s, %s, %s, %s::timestamp, %s::bigint)'
+    content_columns = CONTENT_FIELDS  # колонки vacancies, которые обновляются при изменении вакансии
+    # ключи источников до обхода по регионам -> ключи их прежних регионов (area=1 у hh.ru, town=4 у superjob.ru),
+    # см. vacancy_parser.base_parser.region_scope и migrate_region_scopes
+    legacy_scopes = {'hh': 'hh:1', 'sj': 'sj:4'}
+
+    def __init__(self, pool=None):
+        self.pool = pool or get_pool()
+        if not DataBase.schema_created:
+            self.create_table()
+            self.create_watermark_table()
+            self.create_dead_letter_table()
+            self.create_work_queue_table()
+            self.migrate_region_scopes()
+            self.create_changes_table()
+            self.create_dedup_tables()
+            DataBase.schema_created = True
+
+    def run(self, func):
+        """
+        Принимает:
+        функцию, которая получает курсор и выполняет запросы.
+
+        Назначение:
+        выполнить запросы в одной транзакции на соединении из пула,
+        повторив их на новом соединении, если текущее оборвалось.
+
+        Возвращает:
+        результат функции.
+        """
+        for attempt in range(self.reconnect_attempts + 1):
+            try:
+                with self.pool.connection() as conn:
+                    with conn.cursor() as cursor:
+                        return func(cursor)
+            except (OperationalError, InterfaceError):
+                if attempt == self.reconnect_attempts:
+                    raise
 
     def write_to_database(self, vacancy_id, salary_from,
                           salary_to, curr, areas, url,
                           description, company, title,
                           job_format, date_posted):
-        with self.conn:
-            self.create_table()
-            self.cursor.execute("""INSERT INTO vacancies(
-            vacancy_id, salary_from, salary_to, curr, areas, url, description, company, title, format, date)
-            VALUES(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT(url) DO NOTHING""",
-                                (vacancy_id, salary_from, salary_to,
-                                 curr, areas, url, description, company,
-                                 title, job_format, date_posted)
-                                )
+        return self.write_many([Vacancy(vacancy_id, salary_from, salary_to,
+                                        curr, areas, url, description, company,
+                                        title, job_format, date_posted)])
+
+    def write_many(self, records):
+        """
+        Принимает:
+        список Vacancy (кортежей с информацией о вакансиях в порядке колонок
+        vacancy_id, salary_from, salary_to, curr, areas, url,
+        description, company, title, format, date).
+
+        Назначение:
+        записать все вакансии одним многострочным запросом
+        (по page_size строк в запросе) вместо запроса на каждую вакансию.
+        Вакансия добавляется, только если ее url удалось добавить в vacancy_urls,
+        что заменяет ON CONFLICT(url) для секционированной таблицы.
+        Вместе с url в vacancy_urls хранится хеш содержимого вакансии: если у известного url
+        хеш изменился, колонки content_columns вакансии обновляются, а их прежние значения
+        (только изменившиеся) добавляются в vacancy_changes. Вакансии с тем же хешем не изменяются.
+        О добавленных и измененных вакансиях сообщается в канал changes_channel (NOTIFY)
+        диапазоном их дат: так сервис чтения сбрасывает устаревшие ответы кеша.
+
+        Возвращает:
+        количество добавленных и количество обновленных строк.
+        """
+        if not records:
+            return 0, 0
+        self.create_partitions(record.date for record in records)
+        current = ', '.join(f'v.{column}' for column in self.content_columns)
+        received = ', '.join(f'changed.{column}' for column in self.content_columns)
+        differs = f'({current}) IS DISTINCT FROM ({received})'
+        assignments = ', '.join(f'{column} = changed.{column}' for column in self.content_columns)
+        previous = ', '.join(f"('{column}', to_jsonb(v.{column}), v.{column} IS DISTINCT FROM changed.{column})"
+                             for column in self.content_columns)
+
+        def write(cursor):
+            # все подзапросы WITH видят таблицы до изменений этого запроса: stored - хеши,
+            # записанные раньше, а url, добавленные в new, в stored и changed не попадают
+            rows = execute_values(cursor, f"""WITH data(
+            vacancy_id, salary_from, salary_to, curr, areas, url, description, company, title, format, date,
+            content_hash) AS (VALUES %s),
+            unique_data AS (SELECT DISTINCT ON (url) * FROM data),
+            stored AS (SELECT url, vacancy_urls.content_hash FROM vacancy_urls JOIN unique_data USING (url)),
+            new AS (INSERT INTO vacancy_urls(url, content_hash) SELECT url, content_hash FROM unique_data
+                    ON CONFLICT(url) DO NOTHING RETURNING url),
+            inserted AS (INSERT INTO vacancies(
+                         vacancy_id, salary_from, salary_to, curr, areas, url, description, company, title, format, date)
+                         SELECT vacancy_id, salary_from, salary_to, curr, areas, url, description, company,
+                                title, format, date
+                         FROM unique_data JOIN new USING (url)
+                         RETURNING date),
+            changed AS (SELECT unique_data.*, stored.content_hash AS stored_hash
+                        FROM unique_data JOIN stored USING (url)
+                        WHERE stored.content_hash IS DISTINCT FROM unique_data.content_hash),
+            hashes AS (UPDATE vacancy_urls SET content_hash = changed.content_hash, updated_at = now()
+                       FROM changed WHERE vacancy_urls.url = changed.url),
+            history AS (INSERT INTO vacancy_changes(url, previous)
+                        SELECT v.url, (SELECT jsonb_object_agg(name, value)
+                                       FROM (VALUES {previous}) AS diff(name, value, differs) WHERE differs)
+                        FROM vacancies v JOIN changed USING (url)
+                        -- хеш, записанный до появления хешей (NULL), не означает изменения вакансии
+                        WHERE changed.stored_hash IS NOT NULL AND {differs}),
+            updated AS (UPDATE vacancies v SET {assignments}
+                        FROM changed WHERE v.url = changed.url AND {differs}
+                        RETURNING v.date)
+            SELECT count(*) FILTER (WHERE kind = 'inserted'), count(*) FILTER (WHERE kind = 'updated'),
+                   min(date), max(date)
+            FROM (SELECT 'inserted' AS kind, date FROM inserted
+                  UNION ALL SELECT 'updated', date FROM updated) AS written""",
+                                  [(*record, content_hash(record)) for record in records],
+                                  template=self.record_template, page_size=self.page_size, fetch=True)
+            inserted = sum(row[0] for row in rows)
+            updated = sum(row[1] for row in rows)
+            dates = [date for row in rows for date in row[2:] if date is not None]
+            if dates:
+                cursor.execute('SELECT pg_notify(%s, %s)',
+                               (self.changes_channel, f'{min(dates).isoformat()}|{max(dates).isoformat()}'))
+            return inserted, updated
+
+        return self.run(write)
+
+    def search_vacancies(self, filters, after=None, limit=50):
+        """
+        Принимает:
+        словарь фильтров: salary_from (зарплата от не меньше), salary_to (зарплата до не больше),
+        city, format, company (точное совпадение), date_from, date_to (дата размещения в [date_from, date_to)),
+        q (полнотекстовый поиск по заголовку и описанию),
+        позицию, после которой нужны вакансии - кортеж (дата, id) последней вакансии предыдущей страницы,
+        количество вакансий на странице.
+
+        Назначение:
+        найти вакансии, начиная с самых свежих. Страницы выбираются по ключу (date, id)
+        (keyset pagination), а не через OFFSET, поэтому дальние страницы читаются так же быстро,
+        как первая, и не сдвигаются, когда добавляются новые вакансии.
+
+        Возвращает:
+        список словарей с информацией о вакансиях.
+        """
+        conditions, params = [], []
+        for name, condition in (('salary_from', 'salary_from >= %s'), ('salary_to', 'salary_to <= %s'),
+                                ('city', 'areas = %s'), ('format', 'format = %s'), ('company', 'company = %s'),
+                                ('date_from', 'date >= %s'), ('date_to', 'date < %s'),
+                                ('q', "search @@ plainto_tsquery('russian', %s)")):
+            if filters.get(name) is not None:
+                conditions.append(condition)
+                params.append(filters[name])
+        if after is not None:
+            conditions.append('(date, id) < (%s, %s)')
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        def select(cursor):
+            cursor.execute(f"""SELECT {', '.join(self.search_columns)} FROM vacancies {where}
+                           ORDER BY date DESC, id DESC LIMIT %s""", (*params, limit))
+            return [dict(zip(self.search_columns, row)) for row in cursor.fetchall()]
+
+        return self.run(select)
+
+    def get_urls(self, since, after_id=0, before=None, batch_size=20000):
+        """
+        Принимает:
+        дату, начиная с которой нужны вакансии,
+        id, после которого нужны вакансии,
+        дату, до которой нужны вакансии (None - без ограничения),
+        количество строк в порции.
+
+        Возвращает:
+        порции url вакансий с хешами их содержимого (None, если хеш еще не записан)
+        и датами размещения; строки читаются серверным курсором, поэтому
+        все вакансии окна не собираются в памяти одновременно.
+        """
+        conditions, params = ['id > %s', 'date >= %s'], [after_id, since]
+        if before is not None:
+            conditions.append('date < %s')
+            params.append(before)
+        with self.pool.connection() as conn:
+            with conn.cursor(name='seen_urls') as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(f"""SELECT url, vacancy_urls.content_hash, date FROM vacancies JOIN vacancy_urls USING (url)
+                               WHERE {' AND '.join(conditions)}""", params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+
+    def get_last_id(self):
+        """
+        Возвращает наибольший id вакансии в таблице (None, если таблица пуста).
+        """
+        def select(cursor):
+            cursor.execute('SELECT max(id) FROM vacancies')
+            return cursor.fetchone()[0]
+
+        return self.run(select)
+
+    def get_watermark(self, source):
+        """
+        Возвращает водяной знак источника - дату самой свежей записанной вакансии,
+        либо None, если источник еще не обрабатывался.
+        """
+        def select(cursor):
+            cursor.execute('SELECT published_at FROM watermarks WHERE source = %s', (source,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+        return self.run(select)
+
+    def set_watermark(self, source, published_at):
+        """
+        Сохраняет водяной знак источника. Водяной знак не может сдвинуться назад.
+        """
+        def upsert(cursor):
+            cursor.execute("""INSERT INTO watermarks(source, published_at)
+                           VALUES(%s, %s)
+                           ON CONFLICT(source) DO UPDATE
+                           SET published_at = GREATEST(watermarks.published_at, EXCLUDED.published_at)""",
+                           (source, published_at))
+
+        self.run(upsert)
+
+    def write_dead_letters(self, source, failed):
+        """
+        Принимает:
+        наименование источника,
+        список окон и страниц (начало, конец, страница), которые не удалось получить.
+
+        Назначение:
+        сохранить их для повторного запроса задачей refetch_failed.
+        """
+        def insert(cursor):
+            execute_values(cursor, """INSERT INTO dead_letters(source, time_from, time_to, page)
+                           VALUES %s""", [(source, *item) for item in failed])
+
+        self.run(insert)
+
+    def get_dead_letters(self, source):
+        """
+        Возвращает необработанные записи источника в виде (id, начало, конец, страница),
+        кроме тех, что не удалось получить за dead_letter_attempts попыток.
+        """
+        def select(cursor):
+            cursor.execute("""SELECT id, time_from, time_to, page FROM dead_letters
+                           WHERE source = %s AND resolved_at IS NULL AND attempts < %s
+                           ORDER BY id""", (source, self.dead_letter_attempts))
+            return cursor.fetchall()
+
+        return self.run(select)
+
+    def update_dead_letters(self, resolved, failed):
+        """
+        Отмечает записи resolved обработанными и увеличивает счетчик попыток записей failed.
+        """
+        def update(cursor):
+            if resolved:
+                cursor.execute('UPDATE dead_letters SET resolved_at = now() WHERE id = ANY(%s)', (resolved,))
+            if failed:
+                cursor.execute('UPDATE dead_letters SET attempts = attempts + 1 WHERE id = ANY(%s)', (failed,))
+
+        self.run(update)
+
+    def enqueue_windows(self, source, windows, keep_from):
+        """
+        Принимает:
+        наименование источника,
+        список окон (начало, конец),
+        дату, раньше которой выполненные окна удаляются из очереди.
+
+        Назначение:
+        добавить в очередь окна, которых в ней еще нет. Выполненные и арендованные
+        окна не добавляются повторно, поэтому очередной запуск по расписанию
+        не дублирует работу предыдущего, даже если тот еще не закончился.
+
+        Возвращает:
+        количество добавленных окон.
+        """
+        def insert(cursor):
+            cursor.execute("""DELETE FROM work_queue WHERE source = %s AND status IN ('done', 'failed')
+                           AND time_to < %s""", (source, keep_from))
+            added = execute_values(cursor, """INSERT INTO work_queue(source, time_from, time_to) VALUES %s
+                                   ON CONFLICT(source, time_from, time_to) DO NOTHING RETURNING id""",
+                                   [(source, *window) for window in windows], fetch=True)
+            return len(added)
+
+        return self.run(insert) if windows else 0
+
+    def claim_windows(self, source, limit, lease_timeout, worker):
+        """
+        Принимает:
+        наименование источника,
+        максимальное количество окон,
+        срок аренды в секундах,
+        идентификатор воркера.
+
+        Назначение:
+        арендовать ожидающие окна и окна с истекшей арендой (воркер, который их взял, упал).
+        Строки, заблокированные другим воркером, пропускаются (FOR UPDATE SKIP LOCKED),
+        поэтому одновременно работающие воркеры никогда не получат одно и то же окно.
+        Окна, которые не удалось выполнить за lease_attempts аренд, отмечаются failed
+        и записываются в dead_letters: их повторно запросит refetch_failed, а в очередь
+        они больше не попадают.
+
+        Возвращает:
+        список арендованных окон (id, начало, конец) в порядке начала окна
+        и количество окон, перенесенных в dead_letters.
+        """
+        def claim(cursor):
+            cursor.execute("""WITH exhausted AS (
+                               UPDATE work_queue
+                               SET status = 'failed', leased_until = NULL, finished_at = now()
+                               WHERE id IN (
+                                   SELECT id FROM work_queue
+                                   WHERE source = %s AND attempts >= %s
+                                     AND (status = 'pending' OR (status = 'leased' AND leased_until < now()))
+                                   FOR UPDATE SKIP LOCKED)
+                               RETURNING source, time_from, time_to)
+                           INSERT INTO dead_letters(source, time_from, time_to)
+                           SELECT source, time_from, time_to FROM exhausted""",
+                           (source, self.lease_attempts))
+            exhausted = cursor.rowcount
+            cursor.execute("""UPDATE work_queue
+                           SET status = 'leased', worker = %s, attempts = attempts + 1,
+                               leased_until = now() + %s * interval '1 second'
+                           WHERE id IN (
+                               SELECT id FROM work_queue
+                               WHERE source = %s AND attempts < %s
+                                 AND (status = 'pending' OR (status = 'leased' AND leased_until < now()))
+                               ORDER BY time_from
+                               LIMIT %s
+                               FOR UPDATE SKIP LOCKED)
+                           RETURNING id, time_from, time_to""",
+                           (worker, lease_timeout, source, self.lease_attempts, limit))
+            return sorted(cursor.fetchall(), key=lambda row: row[1]), exhausted
+
+        return self.run(claim)
+
+    def renew_windows(self, leases, lease_timeout, worker):
+        """
+        Продлевает на lease_timeout секунд аренду окон leases, которые все еще арендованы воркером worker,
+        чтобы долгое окно не было выдано другому воркеру, пока его выгружают.
+        """
+        def update(cursor):
+            cursor.execute("""UPDATE work_queue SET leased_until = now() + %s * interval '1 second'
+                           WHERE id = ANY(%s) AND status = 'leased' AND worker = %s""",
+                           (lease_timeout, leases, worker))
+
+        if leases:
+            self.run(update)
+
+    def complete_windows(self, done, released):
+        """
+        Отмечает окна done выполненными, а аренду окон released снимает,
+        чтобы их взял следующий запуск.
+        """
+        def update(cursor):
+            if done:
+                cursor.execute("""UPDATE work_queue SET status = 'done', finished_at = now(), leased_until = NULL
+                               WHERE id = ANY(%s)""", (done,))
+            if released:
+                cursor.execute("""UPDATE work_queue SET status = 'pending', leased_until = NULL
+                               WHERE id = ANY(%s)""", (released,))
+
+        self.run(update)
+
+    def get_dedup_batch(self, after_id, limit, since=None):
+        """
+        Возвращает до limit вакансий (id, title, company, description) с id больше after_id,
+        добавленных не раньше since (None - без ограничения), для которых еще не найдена
+        группа дубликатов (см. db.dedup), в порядке id.
+        Выбираются именно вакансии без строки в vacancy_groups, а не с id больше наибольшего
+        обработанного: парсеры пишут одновременно, и строка с меньшим id может быть
+        зафиксирована уже после обработки строк с большим.
+        """
+        conditions, params = ['id > %s'], [after_id]
+        if since is not None:
+            conditions.append('url IN (SELECT url FROM vacancy_urls WHERE created_at >= %s)')
+            params.append(since)
+
+        def select(cursor):
+            cursor.execute(f"""SELECT id, title, company, description FROM vacancies v
+                           WHERE {' AND '.join(conditions)}
+                           AND NOT EXISTS (SELECT 1 FROM vacancy_groups g WHERE g.id = v.id)
+                           ORDER BY id LIMIT %s""", (*params, limit))
+            return cursor.fetchall()
+
+        return self.run(select)
+
+    def get_dedup_mark(self, settle_minutes):
+        """
+        Возвращает время добавления, начиная с которого вакансии могут быть еще не обработаны
+        поиском дубликатов (None - обработать все), и новое значение этой границы -
+        settle_minutes минут назад по часам базы данных: вакансии, добавленные раньше,
+        уже зафиксированы и будут обработаны текущим запуском.
+        Граница хранится в таблице watermarks под именем dedup_mark.
+        """
+        def select(cursor):
+            cursor.execute('SELECT published_at FROM watermarks WHERE source = %s', (self.dedup_mark,))
+            row = cursor.fetchone()
+            cursor.execute("SELECT localtimestamp - %s * interval '1 minute'", (settle_minutes,))
+            return row[0] if row else None, cursor.fetchone()[0]
+
+        return self.run(select)
+
+    def set_dedup_mark(self, mark):
+        """
+        Сохраняет границу обработанных поиском дубликатов вакансий (см. get_dedup_mark).
+        """
+        self.set_watermark(self.dedup_mark, mark)
+
+    def get_dedup_candidates(self, keys):
+        """
+        Принимает:
+        корзины LSH - пары (полоса, корзина).
+
+        Возвращает:
+        вакансии из этих корзин, по одной строке на вакансию: (id, group_id, сигнатура,
+        список ее корзин из keys). Из каждой корзины берется одна вакансия каждой группы:
+        остальные вакансии группы сравнивать незачем, они попадут в ту же группу.
+        """
+        if not keys:
+            return []
+        bands, buckets = zip(*keys)
+
+        def select(cursor):
+            cursor.execute("""WITH found AS (
+                               SELECT DISTINCT ON (b.band, b.bucket, g.group_id) b.band, b.bucket, g.id
+                               FROM unnest(%s::smallint[], %s::bigint[]) AS k(band, bucket)
+                               JOIN vacancy_buckets b ON b.band = k.band AND b.bucket = k.bucket
+                               JOIN vacancy_groups g ON g.id = b.id
+                               ORDER BY b.band, b.bucket, g.group_id, g.id)
+                           SELECT g.id, g.group_id, g.signature, array_agg(found.band), array_agg(found.bucket)
+                           FROM found JOIN vacancy_groups g ON g.id = found.id
+                           GROUP BY g.id""", (list(bands), list(buckets)))
+            return [(vacancy_id, group_id, bytes(signature), list(zip(row_bands, row_buckets)))
+                    for vacancy_id, group_id, signature, row_bands, row_buckets in cursor]
+
+        return self.run(select)
+
+    def write_dedup(self, groups, buckets):
+        """
+        Принимает:
+        группы вакансий (id, group_id, сигнатура),
+        корзины LSH вакансий (полоса, корзина, id) - по одной вакансии каждой группы в корзине.
+
+        Назначение:
+        записать группы и корзины одной транзакцией: пачка обрабатывается заново,
+        если запись не удалась.
+        """
+        def insert(cursor):
+            execute_values(cursor, """INSERT INTO vacancy_groups(id, group_id, signature) VALUES %s
+                           ON CONFLICT(id) DO NOTHING""", groups, page_size=self.page_size)
+            execute_values(cursor, """INSERT INTO vacancy_buckets(band, bucket, id) VALUES %s
+                           ON CONFLICT DO NOTHING""", buckets, page_size=self.page_size * 16)
+
+        self.run(insert)
 
     def create_table(self):
-        with self.conn:
-            self.cursor.execute("""CREATE TABLE IF NOT EXISTS vacancies (
-                                id SERIAL PRIMARY KEY,
-                                vacancy_id INT,
-                                salary_from INT,
-                                salary_to INT,
-                                curr TEXT,
-                                areas TEXT,
-                                url TEXT UNIQUE,
-                                description TEXT,
-                                company TEXT,
-                                title TEXT,
-                                format TEXT,
-                                date TIMESTAMP);"""
-                                )
+        """
+        Создает секционированную по дате таблицу vacancies и таблицу vacancy_urls.
+
+        Секции помесячные (vacancies_2026_01 и т.д.), создаются при записи (см. create_partitions),
+        поэтому запросы за период читают только секции этого периода.
+        Уникальность url при секционировании обеспечить в самой таблице нельзя
+        (уникальный индекс должен включать ключ секционирования), поэтому url
+        записанных вакансий хранятся в отдельной таблице vacancy_urls с первичным ключом url.
+        В vacancy_urls также хранится хеш содержимого вакансии, по которому write_many
+        находит изменившиеся вакансии.
+        Колонка search - полнотекстовый вектор заголовка и описания с индексом GIN:
+        WHERE search @@ plainto_tsquery('russian', 'python разработчик').
+
+        Если в базе данных осталась прежняя несекционированная таблица vacancies,
+        она переименовывается в vacancies_legacy, а ее строки переносятся в новую схему
+        (см. migrate_legacy_table). Создание схемы выполняется под advisory-блокировкой,
+        поэтому одновременно запущенные воркеры не мигрируют таблицу дважды.
+        """
+        def create(cursor):
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', (self.schema_lock,))
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('vacancies')")
+            row = cursor.fetchone()
+            legacy = row is not None and row[0] == 'r'
+            if legacy:
+                cursor.execute("""ALTER TABLE vacancies RENAME TO vacancies_legacy;
+                               ALTER TABLE vacancies_legacy RENAME CONSTRAINT vacancies_pkey TO vacancies_legacy_pkey;
+                               ALTER TABLE vacancies_legacy RENAME CONSTRAINT vacancies_url_key
+                                   TO vacancies_legacy_url_key;
+                               ALTER SEQUENCE vacancies_id_seq RENAME TO vacancies_legacy_id_seq;""")
+            cursor.execute("""CREATE TABLE IF NOT EXISTS vacancies (
+                           id BIGSERIAL,
+                           vacancy_id INT,
+                           salary_from INT,
+                           salary_to INT,
+                           curr TEXT,
+                           areas TEXT,
+                           url TEXT NOT NULL,
+                           description TEXT,
+                           company TEXT,
+                           title TEXT,
+                           format TEXT,
+                           date TIMESTAMP NOT NULL,
+                           search TSVECTOR GENERATED ALWAYS AS (
+                               to_tsvector('russian', coalesce(title, '') || ' ' || coalesce(description, ''))
+                           ) STORED,
+                           PRIMARY KEY (id, date)
+                           ) PARTITION BY RANGE (date);"""
+                           )
+            cursor.execute("""CREATE TABLE IF NOT EXISTS vacancy_urls (
+                           url TEXT PRIMARY KEY,
+                           created_at TIMESTAMP DEFAULT now(),
+                           content_hash BIGINT,
+                           updated_at TIMESTAMP);"""
+                           )
+            # хеши содержимого появились позже таблицы: у вакансий, записанных раньше, хеш NULL
+            cursor.execute("""ALTER TABLE vacancy_urls ADD COLUMN IF NOT EXISTS content_hash BIGINT,
+                           ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP""")
+            # по времени добавления и изменения выбирает вакансии инкрементальная выгрузка (см. db.export)
+            cursor.execute('CREATE INDEX IF NOT EXISTS vacancy_urls_created_idx ON vacancy_urls (created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS vacancy_urls_updated_idx ON vacancy_urls (updated_at)')
+            for column in self.indexed_columns:
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS vacancies_{column}_idx ON vacancies ({column})')
+            cursor.execute('CREATE INDEX IF NOT EXISTS vacancies_search_idx ON vacancies USING GIN (search)')
+            if legacy:
+                self.migrate_legacy_table(cursor)
+
+        self.run(create)
+
+    def migrate_legacy_table(self, cursor):
+        """
+        Принимает:
+        курсор транзакции, в которой создается схема.
+
+        Назначение:
+        перенести вакансии из прежней таблицы vacancies_legacy в секционированную таблицу
+        с сохранением id. Перенос выполняется в той же транзакции, что и создание схемы:
+        при ошибке база данных остается в прежнем состоянии.
+        Строки без даты или url не переносятся (их нельзя положить в секцию),
+        они остаются в vacancies_legacy; саму таблицу после проверки можно удалить вручную.
+        """
+        cursor.execute("""SELECT DISTINCT date_trunc('month', date) FROM vacancies_legacy
+                       WHERE date IS NOT NULL""")
+        self.create_partitions([row[0] for row in cursor.fetchall()], cursor)
+        cursor.execute("""INSERT INTO vacancy_urls(url)
+                       SELECT url FROM vacancies_legacy WHERE url IS NOT NULL AND date IS NOT NULL
+                       ON CONFLICT(url) DO NOTHING""")
+        cursor.execute("""INSERT INTO vacancies(id, vacancy_id, salary_from, salary_to, curr, areas, url,
+                                               description, company, title, format, date)
+                       SELECT id, vacancy_id, salary_from, salary_to, curr, areas, url,
+                              description, company, title, format, date
+                       FROM vacancies_legacy WHERE url IS NOT NULL AND date IS NOT NULL""")
+        cursor.execute("""SELECT setval(pg_get_serial_sequence('vacancies', 'id'),
+                                      (SELECT coalesce(max(id), 0) + 1 FROM vacancies_legacy), false)""")
+
+    def create_partitions(self, dates, cursor=None):
+        """
+        Принимает:
+        даты вакансий,
+        курсор открытой транзакции (по умолчанию запросы выполняются в отдельной транзакции).
+
+        Назначение:
+        создать помесячные секции vacancies для всех дат, для которых секций еще нет.
+        Созданные секции запоминаются в процессе, поэтому запрос к базе данных
+        выполняется только при появлении вакансий нового месяца. Секции, созданные
+        в чужой транзакции, не запоминаются: она еще может откатиться.
+        """
+        months = {date.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+                  for date in dates} - DataBase.partitions
+        if not months:
+            return
+
+        def create(cursor):
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', (self.schema_lock,))
+            for month in sorted(months):
+                next_month = (month + timedelta(days=32)).replace(day=1)
+                cursor.execute(f"""CREATE TABLE IF NOT EXISTS vacancies_{month:%Y_%m} PARTITION OF vacancies
+                               FOR VALUES FROM (%s) TO (%s)""", (month, next_month))
+
+        if cursor is not None:
+            create(cursor)
+        else:
+            self.run(create)
+            DataBase.partitions.update(months)
+
+    def create_watermark_table(self):
+        def create(cursor):
+            cursor.execute("""CREATE TABLE IF NOT EXISTS watermarks (
+                           source TEXT PRIMARY KEY,
+                           published_at TIMESTAMP);"""
+                           )
+
+        self.run(create)
+
+    def create_dead_letter_table(self):
+        def create(cursor):
+            cursor.execute("""CREATE TABLE IF NOT EXISTS dead_letters (
+                           id SERIAL PRIMARY KEY,
+                           source TEXT,
+                           time_from TIMESTAMP,
+                           time_to TIMESTAMP,
+                           page INT,
+                           attempts INT DEFAULT 1,
+                           created_at TIMESTAMP DEFAULT now(),
+                           resolved_at TIMESTAMP);"""
+                           )
+
+        self.run(create)
+
+    def create_work_queue_table(self):
+        def create(cursor):
+            cursor.execute("""CREATE TABLE IF NOT EXISTS work_queue (
+                           id SERIAL PRIMARY KEY,
+                           source TEXT NOT NULL,
+                           time_from TIMESTAMP NOT NULL,
+                           time_to TIMESTAMP NOT NULL,
+                           status TEXT NOT NULL DEFAULT 'pending',
+                           worker TEXT,
+                           attempts INT DEFAULT 0,
+                           leased_until TIMESTAMP,
+                           created_at TIMESTAMP DEFAULT now(),
+                           finished_at TIMESTAMP,
+                           UNIQUE (source, time_from, time_to));"""
+                           )
+            cursor.execute("""CREATE INDEX IF NOT EXISTS work_queue_claim
+                           ON work_queue (source, time_from) WHERE status <> 'done';"""
+                           )
+
+        self.run(create)
+
+    def migrate_region_scopes(self):
+        """
+        Переносит водяные знаки, dead_letters и окна очереди, записанные до обхода по регионам
+        под ключом источника (hh, sj), на ключ региона, который тогда обходился (hh:1, sj:4).
+        Так инкрементальный поиск продолжается с прежнего водяного знака, а refetch_failed
+        повторяет прежние dead_letters. Если у региона уже есть водяной знак или то же окно
+        очереди, прежняя запись удаляется. Повторный вызов ничего не меняет.
+        """
+        def migrate(cursor):
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', (self.schema_lock,))
+            for source, scope in self.legacy_scopes.items():
+                cursor.execute("""UPDATE watermarks SET source = %s WHERE source = %s
+                               AND NOT EXISTS (SELECT 1 FROM watermarks WHERE source = %s)""",
+                               (scope, source, scope))
+                cursor.execute('DELETE FROM watermarks WHERE source = %s', (source,))
+                cursor.execute('UPDATE dead_letters SET source = %s WHERE source = %s', (scope, source))
+                cursor.execute("""UPDATE work_queue q SET source = %s WHERE source = %s
+                               AND NOT EXISTS (SELECT 1 FROM work_queue r WHERE r.source = %s
+                                               AND r.time_from = q.time_from AND r.time_to = q.time_to)""",
+                               (scope, source, scope))
+                cursor.execute('DELETE FROM work_queue WHERE source = %s', (source,))
+
+        self.run(migrate)
+
+    def create_changes_table(self):
+        """
+        Создает таблицу vacancy_changes - историю изменений вакансий.
+        В previous хранятся прежние значения только изменившихся колонок,
+        например {"salary_from": 100000, "salary_to": null}, а не копия всей строки.
+        """
+        def create(cursor):
+            cursor.execute("""CREATE TABLE IF NOT EXISTS vacancy_changes (
+                           id BIGSERIAL PRIMARY KEY,
+                           url TEXT NOT NULL,
+                           changed_at TIMESTAMP DEFAULT now(),
+                           previous JSONB NOT NULL);"""
+                           )
+            cursor.execute('CREATE INDEX IF NOT EXISTS vacancy_changes_url_idx ON vacancy_changes (url, changed_at)')
+
+        self.run(create)
+
+    def create_dedup_tables(self):
+        """
+        Создает таблицы поиска дубликатов (см. db.dedup):
+        vacancy_groups - группа и сигнатура MinHash каждой обработанной вакансии (id - vacancies.id),
+        vacancy_buckets - корзины LSH, в каждой по одной вакансии группы; по первичному ключу
+        (band, bucket, id) кандидаты находятся без просмотра всех вакансий.
+        """
+        def create(cursor):
+            cursor.execute("""CREATE TABLE IF NOT EXISTS vacancy_groups (
+                           id BIGINT PRIMARY KEY,
+                           group_id BIGINT NOT NULL,
+                           signature BYTEA NOT NULL);"""
+                           )
+            cursor.execute('CREATE INDEX IF NOT EXISTS vacancy_groups_group_idx ON vacancy_groups (group_id)')
+            cursor.execute("""CREATE TABLE IF NOT EXISTS vacancy_buckets (
+                           band SMALLINT NOT NULL,
+                           bucket BIGINT NOT NULL,
+                           id BIGINT NOT NULL,
+                           PRIMARY KEY (band, bucket, id));"""
+                           )
+
+        self.run(create)
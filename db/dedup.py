@@ -0,0 +1,276 @@
+"""
+Поиск одних и тех же вакансий, размещенных на разных сайтах (MinHash + LSH).
+
+Запуск:
+python -m db.dedup
+
+Одна и та же вакансия, размещенная на hh.ru, superjob.ru и rabota.ru, записывается
+тремя строками: url у них разные. Для каждой вакансии по нормализованным заголовку,
+компании и описанию строится сигнатура MinHash - num_perm минимальных значений
+хеш-функций на множестве пар соседних слов. Доля совпадающих позиций двух сигнатур оценивает сходство Жаккара
+их текстов. Сигнатура делится на bands полос; полосы хранятся в таблице vacancy_buckets,
+поэтому кандидаты в дубликаты - вакансии, у которых совпала хотя бы одна полоса, -
+находятся запросом по индексу, а не сравнением со всеми записанными вакансиями.
+Кандидат, сходство с которым не меньше threshold, считается дубликатом:
+вакансия попадает в его группу, иначе создает свою (group_id - id первой вакансии группы).
+В корзине хранится одна вакансия каждой группы: копии массовой вакансии, размещенной
+тысячи раз, не сравниваются друг с другом и не переполняют корзину.
+
+Обработка инкрементальная: каждый запуск обрабатывает пачками по batch_size
+вакансии, для которых еще нет строки в vacancy_groups, в порядке id, начиная
+с границы, сохраненной прошлым запуском (см. DataBase.get_dedup_mark): вакансии,
+добавленные раньше нее, уже обработаны, и таблица не просматривается целиком.
+"""
+import argparse
+import re
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import blake2b, shake_128
+from multiprocessing import current_process
+
+import settings
+from db.database import DataBase
+from logger import write_logs
+
+
+TAG = re.compile(r'<[^>]+>')  # разметка в описаниях, например <highlighttext> у hh.ru
+WORD = re.compile(r'\w+')
+
+
+def normalize(*texts):
+    """
+    Возвращает слова текстов в нижнем регистре, без разметки и знаков препинания.
+    """
+    words = []
+    for text in texts:
+        if text:
+            words.extend(WORD.findall(TAG.sub(' ', text).lower().replace('ё', 'е')))
+    return words
+
+
+def shingles(words, size=2):
+    """
+    Возвращает множество последовательностей из size соседних слов (в виде байтов).
+    """
+    if not words:
+        return set()
+    size = min(size, len(words))
+    return {' '.join(words[i:i + size]).encode() for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """
+    Построение сигнатур MinHash.
+
+    Принимает:
+    количество хеш-функций (длину сигнатуры),
+    длину последовательности слов.
+
+    Значения всех хеш-функций для последовательности слов - 32-битные части одного
+    хеша shake_128 длиной 4 * num_perm байт, а минимумы по каждой хеш-функции
+    считаются срезами массива, без цикла на Python по каждой паре
+    (последовательность, хеш-функция).
+    """
+
+    def __init__(self, num_perm=64, shingle_size=2):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    def signature(self, *texts):
+        """
+        Возвращает сигнатуру текстов (кортеж num_perm чисел) либо None, если в них нет слов.
+        """
+        features = shingles(normalize(*texts), self.shingle_size)
+        if not features:
+            return None
+        values = array('I')
+        values.frombytes(b''.join([shake_128(feature).digest(4 * self.num_perm) for feature in features]))
+        return tuple([min(values[i::self.num_perm]) for i in range(self.num_perm)])
+
+    def row_signature(self, row):
+        """
+        Возвращает сигнатуру вакансии (id, title, company, description); используется в пуле процессов.
+        """
+        return self.signature(*row[1:])
+
+    @staticmethod
+    def similarity(first, second):
+        """
+        Возвращает оценку сходства Жаккара текстов по их сигнатурам.
+        """
+        return sum(x == y for x, y in zip(first, second)) / len(first)
+
+
+class LSHIndex:
+    """
+    Индекс сигнатур MinHash по полосам (locality-sensitive hashing).
+
+    Принимает:
+    количество полос, на которые делится сигнатура длины num_perm.
+
+    Сигнатура делится на bands полос по num_perm / bands значений, каждая полоса
+    хешируется в корзину. Сигнатуры текстов со сходством s попадают хотя бы
+    в одну общую корзину с вероятностью 1 - (1 - s ** rows) ** bands:
+    для 16 полос по 4 значения это 0.99 при s = 0.7 и 0.12 при s = 0.3.
+    В корзине хранится одна вакансия каждой группы (первая добавленная): вакансия,
+    похожая на нее, похожа и на группу. Корзины хранятся в таблице vacancy_buckets;
+    в памяти индекс хранит только вакансии текущей пачки (см. Deduplicator.process).
+    """
+
+    def __init__(self, bands=16):
+        self.bands = bands
+        self.buckets = {}  # (полоса, корзина) -> {group_id: (id, group_id, сигнатура)}
+
+    def keys(self, signature):
+        """
+        Возвращает корзины сигнатуры: список пар (полоса, хеш полосы как BIGINT).
+        """
+        rows = len(signature) // self.bands
+        return [(band, int.from_bytes(blake2b(array('I', signature[band * rows:(band + 1) * rows]).tobytes(),
+                                              digest_size=8).digest(), 'big', signed=True))
+                for band in range(self.bands)]
+
+    def add(self, keys, entry):
+        """
+        Принимает:
+        корзины вакансии,
+        вакансию (id, group_id, сигнатура).
+
+        Возвращает:
+        корзины, в которых у группы вакансии еще не было вакансии, - в них вакансия добавлена.
+        """
+        added = []
+        for key in keys:
+            group = self.buckets.setdefault(key, {})
+            if entry[1] not in group:
+                group[entry[1]] = entry
+                added.append(key)
+        return added
+
+    def candidates(self, keys):
+        found = {}
+        for key in keys:
+            for entry in self.buckets.get(key, {}).values():
+                found[entry[0]] = entry
+        return found
+
+
+class Deduplicator:
+    """
+    Группировка вакансий-дубликатов.
+
+    Принимает:
+    базу данных,
+    длину сигнатуры, количество полос, порог сходства, размер пачки
+    и количество процессов для построения сигнатур (по умолчанию из settings),
+    логгер.
+
+    Назначение:
+    назначить каждой новой вакансии группу (vacancy_groups.group_id): группу самого
+    раннего похожего кандидата либо новую группу из одной вакансии.
+    Для каждой пачки выполняется один запрос кандидатов по корзинам всех ее вакансий,
+    поэтому время обработки растет с количеством новых вакансий, а не с размером таблицы.
+    Похожие вакансии внутри пачки находятся через индекс в памяти.
+    Если новая вакансия похожа на вакансии двух разных групп, группы не объединяются:
+    вакансия попадает в группу с меньшим id.
+    """
+    settle_minutes = 10  # за сколько минут запись вакансии точно завершается (граница следующего запуска)
+
+    def __init__(self, db=None, num_perm=None, bands=None, threshold=None, batch_size=None, workers=None,
+                 logger=None):
+        self.logger = logger or write_logs(self.__class__)
+        self.db = db or DataBase()
+        self.hasher = MinHasher(num_perm or settings.DEDUP_NUM_PERM)
+        self.bands = bands or settings.DEDUP_BANDS
+        self.threshold = threshold or settings.DEDUP_THRESHOLD
+        self.batch_size = batch_size or settings.DEDUP_BATCH
+        self.workers = workers or settings.DEDUP_WORKERS
+        self.pool = None  # пул процессов на время run, если workers больше одного
+        self.processed = 0  # количество обработанных вакансий
+        self.duplicates = 0  # количество вакансий, попавших в существующую группу
+        self.comparisons = 0  # количество сравнений сигнатур
+
+    def run(self):
+        """
+        Обрабатывает все вакансии, которых еще нет в vacancy_groups, начиная с границы прошлого запуска,
+        и сохраняет границу для следующего: вакансии, добавленные за settle_minutes минут до начала запуска.
+
+        Возвращает:
+        сводку: количество обработанных вакансий, найденных дубликатов и сравнений сигнатур.
+        """
+        since, mark = self.db.get_dedup_mark(self.settle_minutes)
+        after_id = 0
+        # построение сигнатур - единственная заметная работа процессора, ее можно разделить между процессами.
+        # Процессы-воркеры Celery (prefork) не могут порождать дочерние процессы,
+        # поэтому в них сигнатуры строятся в текущем процессе.
+        parallel = self.workers > 1 and not current_process().daemon
+        self.pool = ProcessPoolExecutor(self.workers) if parallel else None
+        try:
+            while True:
+                rows = self.db.get_dedup_batch(after_id, self.batch_size, since)
+                if not rows:
+                    break
+                self.process(rows)
+                after_id = rows[-1][0]
+            self.db.set_dedup_mark(mark)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+        report = {'processed': self.processed, 'duplicates': self.duplicates, 'comparisons': self.comparisons}
+        self.logger.info(f'Dedup report: {report}')
+        return report
+
+    def process(self, rows):
+        """
+        Принимает:
+        пачку вакансий (id, title, company, description) в порядке id.
+
+        Назначение:
+        найти для каждой вакансии группу и записать сигнатуры, группы и корзины.
+        """
+        index = LSHIndex(self.bands)
+        if self.pool is not None:
+            signatures = self.pool.map(self.hasher.row_signature, rows, chunksize=max(len(rows) // self.workers, 1))
+        else:
+            signatures = map(self.hasher.row_signature, rows)
+        signed = [(row[0], signature, index.keys(signature) if signature else [])
+                  for row, signature in zip(rows, signatures)]
+        keys = {key for _, _, row_keys in signed for key in row_keys}
+        for vacancy_id, group_id, signature, row_keys in self.db.get_dedup_candidates(keys):
+            values = array('I')
+            values.frombytes(signature)
+            index.add(row_keys, (vacancy_id, group_id, values))
+
+        groups, buckets = [], []
+        for vacancy_id, signature, row_keys in signed:
+            group_id = vacancy_id
+            found = index.candidates(row_keys)
+            self.comparisons += len(found)
+            matches = [group for _, group, other in found.values()
+                       if self.hasher.similarity(signature, other) >= self.threshold]
+            if matches:
+                group_id = min(matches)
+                self.duplicates += 1
+            if signature:
+                # вакансия записывается только в корзины, где еще нет вакансии ее группы
+                added = index.add(row_keys, (vacancy_id, group_id, signature))
+                buckets.extend((band, bucket, vacancy_id) for band, bucket in added)
+            groups.append((vacancy_id, group_id, array('I', signature or ()).tobytes()))
+        self.db.write_dedup(groups, buckets)
+        self.processed += len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-threshold', type=float, help='порог сходства, по умолчанию settings.DEDUP_THRESHOLD')
+    parser.add_argument('-batch', type=int, help='размер пачки, по умолчанию settings.DEDUP_BATCH')
+    parser.add_argument('-workers', type=int, help='количество процессов, по умолчанию settings.DEDUP_WORKERS')
+    args = parser.parse_args()
+    report = Deduplicator(threshold=args.threshold, batch_size=args.batch, workers=args.workers).run()
+    print(f"Processed {report['processed']} vacancies, {report['duplicates']} duplicates", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""
+Потоковая выгрузка вакансий в CSV, JSONL или Parquet.
+
+Запуск:
+python -m db.export -format csv -output vacancies.csv -date-from 2026-01-01 -date-to 2026-02-01
+python -m db.export -format parquet -output hh.parquet -source hh
+python -m db.export -format jsonl -output new.jsonl -state exports/new.state
+
+Вакансии выгружаются частями по chunk_days дней, каждая часть - отдельным запросом:
+CSV - командой COPY ... TO STDOUT прямо в файл, JSONL и Parquet - серверным курсором
+порциями по fetch_size строк. Поэтому память не зависит от размера выгрузки.
+Для Parquet нужен pyarrow (pip install pyarrow).
+
+С параметром -state выгрузка инкрементальная: выгружаются вакансии, добавленные
+(vacancy_urls.created_at) либо измененные (vacancy_urls.updated_at, см. DataBase.write_many)
+с момента, сохраненного в файле состояния, и не позже чем settle_minutes минут назад;
+после выгрузки в файл записывается этот момент. Измененная вакансия попадает в выгрузку
+повторно, с новым содержимым, и потребитель заменяет ее прежнюю версию по url.
+Граница по id для этого не подходит: парсеры пишут одновременно, и строка с меньшим id
+может быть зафиксирована позже строки с большим и пропущена навсегда. Свежие строки
+ждут settle_minutes минут, за которые транзакция записи успевает завершиться.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+from db.database import DataBase
+
+
+COLUMNS = DataBase.search_columns
+
+# шаблоны url вакансий каждого источника: в таблице vacancies нет колонки источника
+SOURCE_URLS = {
+    'hh': '%://hh.ru/%',
+    'sj': '%superjob.ru/%',
+    'rr': '%://www.rabota.ru/%',
+}
+
+
+class VacancyExporter:
+    """
+    Выгрузка вакансий из таблицы vacancies.
+
+    Принимает:
+    базу данных,
+    формат (csv, jsonl, parquet),
+    путь к файлу ('-' - стандартный вывод, кроме parquet),
+    начало и конец периода по дате размещения (None - без ограничения),
+    источник (hh, sj, rr; None - все),
+    путь к файлу состояния инкрементальной выгрузки (None - выгрузить все).
+    """
+    chunk_days = 30  # длина периода одного запроса, в днях
+    settle_minutes = 10  # сколько минут ждет записанная вакансия, прежде чем попасть в инкрементальную выгрузку
+    fetch_size = 5000  # количество строк, которые серверный курсор передает за раз
+    formats = ('csv', 'jsonl', 'parquet')
+
+    def __init__(self, db, fmt, output, date_from=None, date_to=None, source=None, state=None):
+        if fmt not in self.formats:
+            raise ValueError(f'Unknown format {fmt}, expected one of {self.formats}')
+        self.db = db
+        self.fmt = fmt
+        self.output = output
+        self.date_from = date_from
+        self.date_to = date_to
+        self.source = source
+        self.state = state
+        saved = self.read_state()
+        # файл состояния прежнего формата хранит наибольший выгруженный id
+        self.after_id = saved.get('last_id', 0) if 'created_before' not in saved else 0
+        created_from = saved.get('created_before')
+        self.created_from = datetime.fromisoformat(created_from) if created_from else None
+        self.created_before = None  # граница времени записи этой выгрузки, задается в run
+        self.rows = 0  # количество выгруженных строк
+
+    def read_state(self):
+        if self.state and os.path.exists(self.state):
+            with open(self.state) as file:
+                return json.load(file)
+        return {}
+
+    def save_state(self):
+        if not self.state:
+            return
+        os.makedirs(os.path.dirname(self.state) or '.', exist_ok=True)
+        tmp_path = f'{self.state}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'created_before': self.created_before.isoformat(),
+                       'exported_at': datetime.now().isoformat()}, file)
+        os.replace(tmp_path, self.state)
+
+    def where(self, time_from, time_to):
+        """
+        Возвращает условие WHERE и его параметры для части периода.
+        """
+        conditions, params = self.state_conditions()
+        conditions = ['date >= %s', 'date < %s'] + conditions
+        params = [time_from, time_to] + params
+        if self.source:
+            conditions.append('url LIKE %s')
+            params.append(SOURCE_URLS[self.source])
+        return ' AND '.join(conditions), params
+
+    def state_conditions(self):
+        """
+        Возвращает условия инкрементальной выгрузки и их параметры: вакансии, добавленные либо
+        измененные от created_from до created_before (и с id больше after_id для файла состояния прежнего формата).
+        """
+        conditions, params = [], []
+        if self.after_id:
+            conditions.append('id > %s')
+            params.append(self.after_id)
+        if self.created_before is not None:
+            if self.created_from is None:
+                urls = 'SELECT url FROM vacancy_urls WHERE created_at < %s'
+                params.append(self.created_before)
+            else:
+                # измененные с прошлой выгрузки вакансии выгружаются повторно
+                urls = """SELECT url FROM vacancy_urls WHERE created_at >= %s AND created_at < %s
+                          UNION SELECT url FROM vacancy_urls WHERE updated_at >= %s AND updated_at < %s"""
+                params.extend((self.created_from, self.created_before) * 2)
+            conditions.append(f'url IN ({urls})')
+        return conditions, params
+
+    def chunks(self):
+        """
+        Возвращает части периода выгрузки (начало, конец). Период без явных границ
+        ограничивается датами вакансий, которые есть в таблице.
+        """
+        conditions, params = self.state_conditions()
+
+        def bounds(cursor):
+            cursor.execute(f"SELECT min(date), max(date) FROM vacancies WHERE {' AND '.join(conditions) or 'true'}",
+                           params)
+            return cursor.fetchone()
+
+        first, last = self.db.run(bounds)
+        if first is None:
+            return []
+        time_from = self.date_from or first
+        time_to = self.date_to or last + timedelta(microseconds=1)
+        chunks = []
+        while time_from < time_to:
+            chunk_to = min(time_from + timedelta(days=self.chunk_days), time_to)
+            chunks.append((time_from, chunk_to))
+            time_from = chunk_to
+        return chunks
+
+    def run(self):
+        """
+        Выгружает вакансии и сохраняет состояние инкрементальной выгрузки.
+
+        Возвращает:
+        количество выгруженных строк.
+        """
+        if self.state:
+            # время записи вакансий (now() транзакции) берется по часам базы данных
+            def settled(cursor):
+                cursor.execute("SELECT localtimestamp - %s * interval '1 minute'", (self.settle_minutes,))
+                return cursor.fetchone()[0]
+
+            self.created_before = self.db.run(settled)
+        chunks = self.chunks()
+        if self.fmt == 'csv':
+            self.export_csv(chunks)
+        elif self.fmt == 'jsonl':
+            self.export_jsonl(chunks)
+        else:
+            self.export_parquet(chunks)
+        self.save_state()
+        return self.rows
+
+    def open_output(self):
+        if self.output == '-':
+            return sys.stdout, False
+        return open(self.output, 'w', encoding='utf-8', newline=''), True
+
+    def export_csv(self, chunks):
+        file, close = self.open_output()
+        try:
+            csv.writer(file, lineterminator='\n').writerow(COLUMNS)
+            for time_from, time_to in chunks:
+                where, params = self.where(time_from, time_to)
+
+                def copy(cursor):
+                    query = cursor.mogrify(f"""SELECT {', '.join(COLUMNS)} FROM vacancies WHERE {where}
+                                           ORDER BY date, id""", params).decode()
+                    cursor.copy_expert(f'COPY ({query}) TO STDOUT WITH CSV', file)
+                    return cursor.rowcount
+
+                self.rows += self.db.run(copy)
+        finally:
+            if close:
+                file.close()
+
+    def batches(self, chunks):
+        """
+        Возвращает порции строк всех частей периода, читая их серверным курсором.
+        """
+        for time_from, time_to in chunks:
+            where, params = self.where(time_from, time_to)
+            with self.db.pool.connection() as conn:
+                with conn.cursor(name='vacancies_export') as cursor:
+                    cursor.itersize = self.fetch_size
+                    cursor.execute(f"""SELECT {', '.join(COLUMNS)} FROM vacancies WHERE {where}
+                                   ORDER BY date, id""", params)
+                    while True:
+                        rows = cursor.fetchmany(self.fetch_size)
+                        if not rows:
+                            break
+                        self.rows += len(rows)
+                        yield rows
+
+    def export_jsonl(self, chunks):
+        file, close = self.open_output()
+        try:
+            for rows in self.batches(chunks):
+                for row in rows:
+                    file.write(json.dumps(dict(zip(COLUMNS, row)), default=str, ensure_ascii=False))
+                    file.write('\n')
+        finally:
+            if close:
+                file.close()
+
+    def export_parquet(self, chunks):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError('Parquet export requires pyarrow: pip install pyarrow')
+        schema = pa.schema([
+            ('id', pa.int64()), ('vacancy_id', pa.int64()), ('salary_from', pa.int64()),
+            ('salary_to', pa.int64()), ('curr', pa.string()), ('areas', pa.string()),
+            ('url', pa.string()), ('description', pa.string()), ('company', pa.string()),
+            ('title', pa.string()), ('format', pa.string()), ('date', pa.timestamp('us')),
+        ])
+        with pq.ParquetWriter(self.output, schema) as writer:
+            for rows in self.batches(chunks):
+                columns = list(zip(*rows))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+                ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-format', choices=VacancyExporter.formats, default='csv')
+    parser.add_argument('-output', default='-', help="путь к файлу, '-' - стандартный вывод")
+    parser.add_argument('-date-from', dest='date_from', type=datetime.fromisoformat)
+    parser.add_argument('-date-to', dest='date_to', type=datetime.fromisoformat)
+    parser.add_argument('-source', choices=list(SOURCE_URLS))
+    parser.add_argument('-state', help='файл состояния инкрементальной выгрузки')
+    args = parser.parse_args()
+    exporter = VacancyExporter(DataBase(), args.format, args.output, args.date_from, args.date_to,
+                               args.source, args.state)
+    rows = exporter.run()
+    print(f'Exported {rows} vacancies', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from psycopg2 import InterfaceError, OperationalError
+from psycopg2.pool import ThreadedConnectionPool
+
+import settings
+
+
+class ConnectionPool:
+    """
+    Пул соединений с PostgreSQL.
+
+    Принимает:
+    минимальное и максимальное количество соединений,
+    интервал проверки простаивающих соединений (в секундах),
+    параметры подключения к базе данных.
+
+    Назначение:
+    переиспользовать соединения между парсерами и задачами Celery одного процесса.
+    Если соединений не хватает, поток ждет освобождения соединения,
+    а не получает ошибку. Соединение, простаивавшее дольше health_check_interval,
+    проверяется запросом SELECT 1 и пересоздается, если оно оборвалось.
+    После перезапуска PostgreSQL оборваны все простаивающие соединения,
+    поэтому они закрываются одно за другим, пока не найдется рабочее или пул не откроет новое.
+    """
+
+    def __init__(self, minconn, maxconn, health_check_interval=30, **dsn):
+        self.pool = ThreadedConnectionPool(minconn, maxconn, **dsn)
+        self.maxconn = maxconn
+        self.available = threading.BoundedSemaphore(maxconn)
+        self.health_check_interval = health_check_interval
+        self.last_used = {}  # время последнего использования соединения
+
+    def is_healthy(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - self.last_used.get(id(conn), 0) < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except (OperationalError, InterfaceError):
+            return False
+
+    def getconn(self):
+        self.available.acquire()
+        try:
+            # простаивающих соединений не больше maxconn, после них пул открывает новое
+            for _ in range(self.maxconn + 1):
+                conn = self.pool.getconn()
+                if self.is_healthy(conn):
+                    return conn
+                self.putconn(conn, close=True, release=False)
+            raise OperationalError('no healthy connection to the database')
+        except Exception:
+            self.available.release()
+            raise
+
+    def putconn(self, conn, close=False, release=True):
+        self.last_used.pop(id(conn), None)
+        if not close:
+            self.last_used[id(conn)] = time.monotonic()
+        self.pool.putconn(conn, close=close)
+        if release:
+            self.available.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Выдает соединение из пула и возвращает его обратно.
+
+        Транзакция фиксируется при успешном выходе из блока и откатывается при ошибке.
+        Оборванное соединение закрывается, а не возвращается в пул.
+        """
+        conn = self.getconn()
+        broken = False
+        try:
+            with conn:
+                yield conn
+        except (OperationalError, InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken or bool(conn.closed))
+
+    def closeall(self):
+        self.pool.closeall()
+        self.last_used.clear()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def connection_params():
+    """
+    Возвращает параметры подключения к базе данных из settings.
+    """
+    return {
+        'user': settings.DB_USER,
+        'password': settings.DB_PASSWORD,
+        'host': settings.DB_HOST,
+        'port': settings.DB_PORT,
+        'database': settings.DB_NAME,
+    }
+
+
+def get_pool():
+    """
+    Возвращает пул соединений текущего процесса.
+
+    Пул создается при первом обращении. После fork (воркеры Celery) дочерний процесс
+    создает собственный пул, не используя соединения родителя.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(
+                settings.DB_POOL_MIN,
+                settings.DB_POOL_MAX,
+                health_check_interval=settings.DB_HEALTH_CHECK_INTERVAL,
+                **connection_params()
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def close_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _pool_pid = None
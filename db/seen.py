@@ -0,0 +1,160 @@
+import os
+from array import array
+from datetime import date, datetime, timedelta
+from hashlib import blake2b
+from math import ceil
+
+from vacancy_parser.vacancy import content_hash
+
+
+class SeenFilter:
+    """
+    Фильтр уже записанных вакансий.
+
+    Принимает:
+    путь к файлу снимка (None - без снимка).
+
+    Назначение:
+    отбрасывать вакансии, которые уже есть в базе данных в том же виде,
+    до отправки запроса в PostgreSQL.
+
+    Для каждой вакансии хранится 8-байтовый хеш url, хеш ее содержимого
+    (см. vacancy_parser.vacancy.content_hash) и день размещения, поэтому миллион вакансий
+    занимает в снимке около 20 Мб. Вакансия с известным url, у которой изменились зарплата,
+    описание и т.п., не отбрасывается: база данных обновит ее (см. DataBase.write_many).
+    Фильтр наполняется из снимка предыдущего запуска и из базы данных:
+    из базы запрашиваются только вакансии окна поиска, добавленные после сохранения
+    снимка (id больше последнего известного), и вакансии, размещенные раньше даты,
+    с которой наполнен снимок, если окно поиска начинается раньше нее.
+    При сохранении отбрасываются вакансии, размещенные раньше всех окон поиска запуска,
+    поэтому снимок не растет от запуска к запуску. Если хеш url не найден или устарел,
+    вакансия передается в базу данных, где неизменная вакансия все равно не записывается.
+    """
+    version = 0x5345454e33000000  # первый элемент снимка: формат с датами размещения вакансий
+    epoch = datetime(1970, 1, 1)  # отсчет даты, с которой наполнен снимок, в заголовке
+
+    def __init__(self, path=None):
+        self.path = path
+        self.keys = {}  # хеш url -> хеш содержимого
+        self.days = {}  # хеш url -> день размещения вакансии (date.toordinal)
+        self.last_id = 0  # наибольший id вакансии, известный фильтру
+        self.since = None  # дата, начиная с которой в фильтре есть все записанные вакансии
+        self.window = None  # самая ранняя дата, начиная с которой фильтр наполнялся в этом запуске
+        self.loaded = False  # снимок уже прочитан
+        self.checked = 0  # количество проверенных вакансий
+        self.hits = 0  # количество отброшенных вакансий
+        self.changed = 0  # количество известных вакансий, содержимое которых изменилось
+
+    @staticmethod
+    def key(url):
+        return int.from_bytes(blake2b(url.encode(), digest_size=8).digest(), 'big')
+
+    def load(self, db, since):
+        """
+        Принимает:
+        экземпляр DataBase,
+        дату, начиная с которой вакансии запрашиваются из базы данных.
+
+        Назначение:
+        наполнить фильтр из снимка и из базы данных.
+        Снимок читается один раз; повторный вызов (например, для следующего региона
+        с общим фильтром) запрашивает из базы только вакансии, записанные после
+        прошлого вызова, и вакансии между since и датой, с которой фильтр уже наполнен.
+        Снимок прежнего формата (без дат размещения) не читается.
+        """
+        if not self.loaded:
+            self.read()
+            self.loaded = True
+        last_id = db.get_last_id() or 0
+        self.add(db.get_urls(since, self.last_id))
+        if self.since is not None and since < self.since:
+            self.add(db.get_urls(since, 0, self.since))
+        self.last_id = max(self.last_id, last_id)
+        self.since = since if self.since is None else min(self.since, since)
+        self.window = since if self.window is None else min(self.window, since)
+
+    def read(self):
+        """
+        Наполняет фильтр из снимка на диске, если он есть.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as file:
+            header = array('Q')
+            header.frombytes(file.read(24))
+            if len(header) != 3 or header[0] != self.version:
+                return
+            # после заголовка - хеши url, затем хеши содержимого и дни размещения в том же порядке
+            data = file.read()
+        count = len(data) // 20
+        keys, hashes, days = array('Q'), array('q'), array('I')
+        keys.frombytes(data[:count * 8])
+        hashes.frombytes(data[count * 8:count * 16])
+        days.frombytes(data[count * 16:count * 20])
+        self.keys.update(zip(keys, hashes))
+        self.days.update(zip(keys, days))
+        self.last_id = header[1]
+        self.since = self.epoch + timedelta(seconds=header[2]) if header[2] else None
+
+    def add(self, batches):
+        """
+        Принимает:
+        порции url вакансий с хешами содержимого и датами размещения (см. DataBase.get_urls).
+        """
+        for rows in batches:
+            for url, digest, published in rows:
+                key = self.key(url)
+                self.keys[key] = digest
+                self.days[key] = published.toordinal()
+
+    def save(self):
+        """
+        Сохраняет снимок фильтра на диск, отбросив вакансии, размещенные раньше окон поиска запуска.
+        """
+        if not self.path:
+            return
+        if self.window is not None:
+            cutoff = self.window.toordinal()
+            for key in [key for key, day in self.days.items() if day < cutoff]:
+                del self.keys[key], self.days[key]
+            self.since = self.window
+        # дата, начиная с которой наполнен снимок, округляется вверх до секунды
+        since = ceil((self.since - self.epoch).total_seconds()) if self.since else 0
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as file:
+            array('Q', [self.version, self.last_id, since]).tofile(file)
+            array('Q', self.keys.keys()).tofile(file)
+            # хеш содержимого вакансий, записанных до его появления, неизвестен (None)
+            array('q', (digest or 0 for digest in self.keys.values())).tofile(file)
+            array('I', (self.days[key] for key in self.keys)).tofile(file)
+        os.replace(tmp_path, self.path)
+
+    def filter(self, records):
+        """
+        Принимает:
+        список Vacancy.
+
+        Возвращает:
+        новые вакансии и вакансии, содержимое которых изменилось;
+        их хеши url и содержимого запоминаются в фильтре.
+        """
+        new = []
+        today = date.today().toordinal()  # день размещения вакансии без даты
+        for record in records:
+            key = self.key(record.url)
+            digest = content_hash(record)
+            stored = self.keys.get(key)
+            if stored != digest:
+                if stored:  # 0 либо None - хеш содержимого неизвестен
+                    self.changed += 1
+                self.keys[key] = digest
+                self.days[key] = record.date.toordinal() if record.date else today
+                new.append(record)
+        self.checked += len(records)
+        self.hits += len(records) - len(new)
+        return new
+
+    @property
+    def hit_rate(self):
+        return round(self.hits / self.checked, 3) if self.checked else None
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+from queue import SimpleQueue
+
+import settings
+
+
+class AsyncWriter:
+    """
+    Фоновая запись вакансий в базу данных.
+
+    Принимает:
+    экземпляр DataBase,
+    логгер для записи ошибок,
+    наибольшее количество пакетов, ожидающих записи (по умолчанию settings.WRITER_MAX_PENDING).
+
+    Назначение:
+    вынести синхронные запросы psycopg2 из цикла событий.
+    Корутины парсера кладут пакеты вакансий в очередь методом write()
+    и продолжают работу, а отдельный поток записывает их в базу данных.
+    Если в очереди уже max_pending пакетов, write() ждет, пока поток запишет один из них:
+    при медленной базе данных парсеры приостанавливаются, а не копят вакансии в памяти.
+    Метод flush() дожидается записи всех пакетов, поставленных в очередь,
+    метод close() вдобавок останавливает поток.
+
+    Один писатель может быть общим для нескольких парсеров (см. Orchestrator):
+    у каждого пакета есть владелец, которому поток прибавляет количество
+    добавленных (inserted) и обновленных (updated) строк и ошибок записи (write_errors),
+    а в метрики владельца записывает время записи пакета и количество строк,
+    которые уже были в базе данных в том же виде.
+    """
+    _stop = object()  # маркер завершения работы потока
+    _flush = object()  # маркер, по которому поток сообщает о записи всех предыдущих пакетов
+
+    def __init__(self, db, logger=None, max_pending=None):
+        self.db = db
+        self.logger = logger
+        self.max_pending = max_pending or settings.WRITER_MAX_PENDING
+        self.queue = SimpleQueue()
+        self.thread = None
+        self.loop = None
+        self.slots = None  # asyncio.Semaphore на max_pending пакетов, создается при запуске потока
+        self.inserted = 0  # количество добавленных строк
+        self.updated = 0  # количество обновленных строк
+        self.errors = 0  # количество пакетов, которые не удалось записать
+
+    def start(self):
+        if self.thread is None:
+            self.loop = asyncio.get_running_loop()
+            self.slots = asyncio.Semaphore(self.max_pending)
+            self.thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+            self.thread.start()
+
+    async def write(self, records, owner=None):
+        """
+        Ставит пакет вакансий в очередь на запись, не блокируя цикл событий.
+        Если очередь заполнена, ждет, пока поток запишет один из пакетов.
+        """
+        if records:
+            await self.slots.acquire()
+            self.queue.put((records, owner))
+
+    def _run(self):
+        while True:
+            records, owner = self.queue.get()
+            if records is self._stop:
+                break
+            if records is self._flush:
+                owner()  # сообщаем ожидающей корутине, что пакеты до маркера записаны
+                continue
+            metrics = getattr(owner, 'metrics', None)
+            started = time.perf_counter()
+            try:
+                inserted, updated = self.db.write_many(records)
+                self.inserted += inserted
+                self.updated += updated
+                if owner is not None:
+                    owner.inserted += inserted
+                    owner.updated += updated
+                if metrics is not None:
+                    metrics.observe('write_seconds', time.perf_counter() - started)
+                    metrics.inc('rows_inserted', inserted)
+                    metrics.inc('rows_updated', updated)
+                    metrics.inc('rows_skipped_conflict', len(records) - inserted - updated)
+            except Exception as e:
+                self.errors += 1
+                if owner is not None:
+                    owner.write_errors += 1
+                if metrics is not None:
+                    metrics.inc('write_errors')
+                if self.logger:
+                    self.logger.error('Not written %s vacancies: %s', len(records), e)
+            finally:
+                self.loop.call_soon_threadsafe(self.slots.release)
+
+    async def flush(self):
+        """
+        Дожидается записи всех пакетов, поставленных в очередь до вызова.
+        """
+        if self.thread is None:
+            return
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        self.queue.put((self._flush, lambda: loop.call_soon_threadsafe(done.set_result, None)))
+        await done
+
+    async def close(self):
+        """
+        Дожидается записи всех пакетов и останавливает поток.
+        """
+        if self.thread is None:
+            return
+        self.queue.put((self._stop, None))
+        await asyncio.get_running_loop().run_in_executor(None, self.thread.join)
+        self.thread = None
@@ -1,6 +1,138 @@
 import os
+import atexit
 import logging
 import logging.config
+import logging.handlers
+import queue
+import time
+
+
+class RoutingFileHandler(logging.Handler):
+    """
+    Обработчик, который пишет записи каждого логгера в свой файл logs/<имя логгера>.log.
+    Файлы открываются при первой записи.
+    """
+
+    def __init__(self, directory='logs'):
+        super().__init__()
+        self.directory = directory
+        self.handlers = {}
+
+    def emit(self, record):
+        name = record.name.split('.')[0]
+        if name not in self.handlers:
+            os.makedirs(self.directory, exist_ok=True)
+            handler = logging.FileHandler(os.path.join(self.directory, f'{name}.log'), encoding='utf-8')
+            handler.setFormatter(self.formatter)
+            self.handlers[name] = handler
+        self.handlers[name].emit(record)
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        super().close()
+
+
+class RateLimitedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Обработчик, который передает записи в очередь для QueueListener,
+    не выполняя запись на диск в вызывающем потоке (в цикле событий).
+
+    Принимает:
+    очередь,
+    количество одинаковых сообщений, которые пишутся за interval секунд,
+    длину интервала в секундах.
+
+    Одинаковыми считаются записи одного логгера и уровня с одним шаблоном сообщения
+    (для этого в частых сообщениях значения передаются аргументами: logger.error('Not parsed %s', url)).
+    Сверх burst записей за интервал сообщения уровня WARNING и выше отбрасываются,
+    а с первой записью следующего интервала пишется количество отброшенных,
+    поэтому отказ сайта не превращается в тысячи одинаковых строк.
+    """
+
+    def __init__(self, log_queue, burst=10, interval=60):
+        super().__init__(log_queue)
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}  # шаблон сообщения -> [начало интервала, записано, отброшено]
+
+    def emit(self, record):
+        if record.levelno < logging.WARNING:
+            return super().emit(record)
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            if window is not None and window[2]:
+                self.emit_suppressed(record, window[2])
+            window = self.windows[key] = [now, 0, 0]
+        if window[1] < self.burst:
+            window[1] += 1
+            super().emit(record)
+        else:
+            window[2] += 1
+
+    def emit_suppressed(self, record, count, msg=None):
+        summary = logging.LogRecord(record.name, record.levelno, record.pathname, record.lineno,
+                                    'Suppressed %d messages like: %s', (count, msg or record.msg), None)
+        super().emit(summary)
+
+    def flush_suppressed(self):
+        """
+        Пишет количество отброшенных сообщений незакончившихся интервалов.
+        """
+        for (name, levelno, msg), (_, _, suppressed) in self.windows.items():
+            if suppressed:
+                record = logging.LogRecord(name, levelno, __file__, 0, msg, None, None)
+                self.emit_suppressed(record, suppressed, msg)
+        self.windows.clear()
+
+
+_listener = None
+_handler = None
+_pid = None
+
+
+def setup_logging():
+    """
+    Настраивает логгирование процесса один раз: читает log.config
+    и заменяет файловые обработчики корневого логгера на очередь,
+    из которой записи пишет на диск отдельный поток (QueueListener).
+    Для дочерних процессов (воркеры Celery) настройка выполняется заново.
+    """
+    global _listener, _handler, _pid
+    if _pid == os.getpid():
+        return
+    parent_path = os.path.abspath(os.path.dirname(__file__))
+    log_conf_path = os.path.join(parent_path, 'log.config')
+    logging.config.fileConfig(fname=log_conf_path, disable_existing_loggers=False)
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+    log_queue = queue.SimpleQueue()
+    _handler = RateLimitedQueueHandler(log_queue)
+    root.addHandler(_handler)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    if _pid is None:
+        atexit.register(stop_logging)
+    _pid = os.getpid()
+
+
+def stop_logging():
+    """
+    Дописывает на диск все записи из очереди и останавливает поток записи.
+    """
+    global _listener, _pid
+    if _listener is None or _pid != os.getpid():
+        return
+    _handler.flush_suppressed()
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _pid = None
 
 
 def write_logs(cls, level='INFO'):
@@ -11,19 +143,11 @@ def write_logs(cls, level='INFO'):
     класс,
     необязательный параметр уровень логгирования (по умолчанию INFO).
 
-    Определяет наименование директории, в которой расположен файл с классом,
-    и создает в этой директории файл для записи.
-    Читает конфигурации и файла с настройками,
-    создает логгер.
-
+    Настраивает логгирование процесса при первом вызове (см. setup_logging)
+    и возвращает логгер с именем класса. Записи логгера пишутся
+    в файл logs/<имя класса>.log потоком QueueListener, а не в цикле событий.
     """
-    parent_path = os.path.abspath(os.path.dirname(__file__))
-    log_conf_path = os.path.join(parent_path, 'log.config')
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-    logging.config.fileConfig(fname=log_conf_path,
-                              defaults={'logfilename': f'logs/{cls.__name__}.log'},
-                              disable_existing_loggers=False)
+    setup_logging()
     logger = logging.getLogger(cls.__name__)
     logger.setLevel(level)
     return logger
@@ -0,0 +1,205 @@
+"""
+Метрики запуска парсеров.
+
+Каждый парсер собирает метрики своего запуска в экземпляр Metrics: счетчики
+(запросы, байты, страницы, окна, добавленные и отброшенные строки, повторы)
+и гистограммы времени (задержка запроса, разбор страницы, запись пакета в базу данных).
+
+Метрики доступны тремя способами:
+JSON-отчетом (Metrics.to_dict, входит в Parser.report),
+текстом в формате Prometheus по адресу /metrics (start_server, settings.METRICS_PORT)
+и отправкой в Prometheus Pushgateway после каждого запуска (push, settings.METRICS_PUSH_URL) -
+для задач Celery, которые живут меньше интервала опроса Prometheus.
+"""
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+from aiohttp import web
+
+import settings
+
+
+PREFIX = 'vacancy_parser'
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # границы гистограмм времени, в секундах
+
+COUNTERS = {
+    'requests': 'HTTP requests sent',
+    'retries': 'HTTP requests repeated after an error',
+    'errors': 'HTTP requests that failed after all retries',
+    'bytes': 'Response bytes downloaded',
+    'pages': 'Result pages processed',
+    'windows': 'Search windows fetched',
+    'rows_inserted': 'Vacancies inserted into the database',
+    'rows_updated': 'Vacancies whose content changed and was updated in the database',
+    'rows_skipped_seen': 'Vacancies dropped by the seen filter',
+    'rows_skipped_conflict': 'Vacancies already present in the database unchanged',
+    'write_errors': 'Vacancy batches that failed to be written',
+}
+
+HISTOGRAMS = {
+    'request_seconds': 'HTTP request latency',
+    'parse_seconds': 'Time to parse one result page',
+    'write_seconds': 'Time to write one batch of vacancies',
+}
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными границами корзин, как в Prometheus.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # количество значений в каждой корзине (не накопительно)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total, result = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'avg': round(self.sum / self.count, 4) if self.count else None,
+            'buckets': {str(bound): count for bound, count in self.cumulative()},
+        }
+
+
+class Metrics:
+    """
+    Метрики одного запуска парсера.
+
+    Принимает:
+    наименование источника,
+    id региона (None - источник без регионов).
+
+    Счетчики и гистограммы обновляются из цикла событий и из потока
+    фонового писателя (время записи пакетов), поэтому изменения защищены блокировкой.
+    Последний созданный экземпляр для каждого источника и региона хранится в registry
+    и отдается по адресу /metrics с метками source и region.
+    """
+    registry = {}  # последние метрики каждого источника и региона процесса
+
+    def __init__(self, source, region=None):
+        self.source = source
+        self.region = region
+        self.labels = f'source="{source}"' + (f',region="{region}"' if region is not None else '')
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.histograms = {name: Histogram() for name in HISTOGRAMS}
+        Metrics.registry[source, region] = self
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def observe(self, name, value):
+        with self.lock:
+            self.histograms[name].observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def to_dict(self):
+        with self.lock:
+            result = dict(self.counters)
+            result.update((name, histogram.to_dict()) for name, histogram in self.histograms.items())
+        return result
+
+    def push(self, url=None):
+        """
+        Отправляет метрики в Prometheus Pushgateway
+        (группа job=vacancy_parser, source=<источник>, region=<регион>, если он задан).
+        """
+        url = url or settings.METRICS_PUSH_URL
+        if not url:
+            return
+        group = f'source/{self.source}' + (f'/region/{self.region}' if self.region is not None else '')
+        request = urllib.request.Request(
+            f'{url.rstrip("/")}/metrics/job/{PREFIX}/{group}',
+            data=render([self]).encode(), method='PUT',
+            headers={'Content-Type': 'text/plain; version=0.0.4'},
+        )
+        with urllib.request.urlopen(request, timeout=10):
+            pass
+
+
+def render(metrics):
+    """
+    Принимает:
+    список экземпляров Metrics.
+
+    Возвращает:
+    метрики в текстовом формате Prometheus.
+    """
+    lines = []
+    for name, description in COUNTERS.items():
+        lines.append(f'# HELP {PREFIX}_{name}_total {description}')
+        lines.append(f'# TYPE {PREFIX}_{name}_total counter')
+        for item in metrics:
+            lines.append(f'{PREFIX}_{name}_total{{{item.labels}}} {item.counters[name]}')
+    for name, description in HISTOGRAMS.items():
+        lines.append(f'# HELP {PREFIX}_{name} {description}')
+        lines.append(f'# TYPE {PREFIX}_{name} histogram')
+        for item in metrics:
+            with item.lock:
+                histogram = item.histograms[name]
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{PREFIX}_{name}_bucket{{{item.labels},le="{bound}"}} {count}')
+                lines.append(f'{PREFIX}_{name}_bucket{{{item.labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'{PREFIX}_{name}_sum{{{item.labels}}} {histogram.sum}')
+                lines.append(f'{PREFIX}_{name}_count{{{item.labels}}} {histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+
+async def start_server(port=None, logger=None):
+    """
+    Запускает в текущем цикле событий HTTP-сервер с метриками всех источников по адресу /metrics.
+    Если порт уже занят (например, другим процессом-воркером), ошибка записывается в лог,
+    а обход продолжается без сервера метрик.
+
+    Возвращает:
+    aiohttp.web.AppRunner (для остановки - await runner.cleanup()) либо None,
+    если порт не задан или сервер не удалось запустить.
+    """
+    port = port or settings.METRICS_PORT
+    if not port:
+        return None
+
+    async def handle(request):
+        return web.Response(text=render(list(Metrics.registry.values())),
+                            content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, port=port).start()
+    except OSError as e:
+        await runner.cleanup()
+        if logger:
+            logger.error(f'Metrics server not started on port {port}: {e}')
+        return None
+    return runner
@@ -1,20 +1,22 @@
 import argparse
 
-from task.tasks import parse_hh, parse_sj, parse_rr
+from task.tasks import parse_all
 
 
-def start_parse_vacancy(period):
-    parse_hh(period)
-    parse_sj(period)
-    parse_rr(period)
+def start_parse_vacancy(period, backfill=False):
+    # все источники обходятся одновременно, см. vacancy_parser.orchestrator
+    summary = parse_all(period, backfill)
+    print(summary)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-parse', action='store_const', const=True)
     parser.add_argument('-period', type=int)
+    parser.add_argument('-backfill', action='store_const', const=True, default=False,
+                        help='искать вакансии за весь период, а не с последнего запуска')
     args = parser.parse_args()
 
     if args.parse:
         print('parse start')
-        start_parse_vacancy(args.period)
+        start_parse_vacancy(args.period, args.backfill)
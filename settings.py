@@ -0,0 +1,130 @@
+"""
+Настройки проекта.
+
+Все значения можно переопределить переменными окружения.
+"""
+import os
+from urllib.parse import quote_plus
+
+
+DB_USER = os.environ.get('DB_USER', 'postgres')
+DB_PASSWORD = os.environ.get('DB_PASSWORD', '1111')
+DB_HOST = os.environ.get('DB_HOST', 'localhost')
+DB_PORT = os.environ.get('DB_PORT', '5432')
+DB_NAME = os.environ.get('DB_NAME', 'database')
+
+# Размер пула соединений в одном процессе.
+# Для prefork-воркеров Celery достаточно пары соединений на процесс,
+# для threads/gevent пулов DB_POOL_MAX стоит выставить равным --concurrency.
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', os.environ.get('CELERY_WORKER_CONCURRENCY', 4)))
+# Соединение, простаивавшее дольше этого времени (в секундах), проверяется перед выдачей.
+DB_HEALTH_CHECK_INTERVAL = int(os.environ.get('DB_HEALTH_CHECK_INTERVAL', 30))
+
+# Перекрытие инкрементального поиска с предыдущим, в минутах: вакансии, опубликованные
+# незадолго до водяного знака, могут появиться в API с задержкой.
+WATERMARK_OVERLAP = int(os.environ.get('WATERMARK_OVERLAP', 60))
+
+# Ограничения частоты запросов по хостам: запросов в секунду и размер пачки запросов без ожидания.
+# Переопределяются переменной окружения вида RATE_LIMITS="api.superjob.ru=2/10,api.hh.ru=20/70".
+RATE_LIMITS = {
+    'api.hh.ru': (20, 70),
+    'api.superjob.ru': (2, 10),  # SuperJob допускает не более 120 запросов в минуту с одного IP
+    'www.rabota.ru': (8, 24),
+}
+DEFAULT_RATE_LIMIT = (5, 10)
+for item in filter(None, os.environ.get('RATE_LIMITS', '').split(',')):
+    host, limit = item.split('=')
+    rate, burst = limit.split('/')
+    RATE_LIMITS[host.strip()] = (float(rate), int(burst))
+
+# Повторы неудачных запросов: количество попыток, базовая и максимальная пауза в секундах.
+RETRY_ATTEMPTS = int(os.environ.get('RETRY_ATTEMPTS', 4))
+RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', 1))
+RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', 60))
+# Предохранитель: после скольких ошибок подряд хост считается недоступным и на сколько секунд.
+BREAKER_THRESHOLD = int(os.environ.get('BREAKER_THRESHOLD', 20))
+BREAKER_RESET_TIMEOUT = float(os.environ.get('BREAKER_RESET_TIMEOUT', 60))
+
+# Количество процессов для разбора страниц rabota.ru (по умолчанию - по числу ядер).
+RR_PARSE_WORKERS = int(os.environ.get('RR_PARSE_WORKERS', 0)) or None
+
+# Каталог для снимков фильтра уже записанных вакансий (db.seen.SeenFilter).
+SEEN_DIR = os.environ.get('SEEN_DIR', 'seen')
+
+# Верхняя граница количества одновременных подключений к каждому источнику
+# (фактическое количество подбирается по состоянию API, см. AdaptiveLimiter).
+# Переопределяется переменной окружения вида SOURCE_CONCURRENCY="hh=70,sj=100,rr=24".
+SOURCE_CONCURRENCY = {'hh': 70, 'sj': 100, 'rr': 24}
+for item in filter(None, os.environ.get('SOURCE_CONCURRENCY', '').split(',')):
+    source, limit = item.split('=')
+    SOURCE_CONCURRENCY[source.strip()] = int(limit)
+
+# Регионы обхода по источникам: id региона в API (area у hh.ru, town у superjob.ru)
+# и наибольшая длина окна поиска в минутах. Регионы источника обходятся одновременно
+# и делят ограничения хоста (SOURCE_CONCURRENCY и RATE_LIMITS). В небольшом регионе
+# за сутки публикуется меньше вакансий, чем ограничение API на один поиск,
+# поэтому окна шире, а запросов меньше, чем для Москвы.
+# Переопределяется переменной окружения вида REGIONS="hh=1:360|2:720|88,sj=4:360";
+# для региона без длины окна используется REGION_WINDOW_MINUTES.
+# rabota.ru показывает вакансии города, который определяет сам, и по регионам не обходится.
+REGION_WINDOW_MINUTES = int(os.environ.get('REGION_WINDOW_MINUTES', 1440))
+REGIONS = {'hh': {'1': 360}, 'sj': {'4': 360}}
+for item in filter(None, os.environ.get('REGIONS', '').split(',')):
+    source, regions = item.split('=')
+    REGIONS[source.strip()] = {}
+    for region in filter(None, regions.split('|')):
+        region, _, minutes = region.partition(':')
+        REGIONS[source.strip()][region.strip()] = int(minutes) if minutes else REGION_WINDOW_MINUTES
+
+# Конвейер обхода (см. vacancy_parser.pipeline): количество окон поиска, которые проверяются одновременно,
+# наибольшее количество заданий этапа (страниц, ожидающих запроса; у rabota.ru - страниц, ожидающих разбора)
+# и количество пакетов вакансий, ожидающих записи в базу данных.
+# Страницы запрашивают столько обработчиков, сколько допускает SOURCE_CONCURRENCY.
+PIPELINE_WINDOW_WORKERS = int(os.environ.get('PIPELINE_WINDOW_WORKERS', 8))
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', 50))
+WRITER_MAX_PENDING = int(os.environ.get('WRITER_MAX_PENDING', 16))
+
+# Длина шарда периода, в часах: при распределенном обходе (task.tasks.parse_period)
+# каждый шард выгружается отдельной задачей Celery на любом воркере.
+SHARD_HOURS = float(os.environ.get('SHARD_HOURS', 24))
+
+# Хранилище результатов задач Celery; нужно для сводки шардов (chord).
+# По умолчанию результаты хранятся в той же базе PostgreSQL (через SQLAlchemy);
+# имя пользователя и пароль экранируются, чтобы символы @, / и : не ломали адрес.
+CELERY_RESULT_BACKEND = os.environ.get(
+    'CELERY_RESULT_BACKEND',
+    f'db+postgresql://{quote_plus(DB_USER)}:{quote_plus(DB_PASSWORD)}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+)
+
+# Очередь окон (db.database.DataBase.enqueue_windows): длина окна в минутах
+# для источников без регионов (у региона окно очереди равно его длине окна из REGIONS),
+# задержка, после которой закончившееся окно попадает в очередь (вакансии появляются
+# в API не мгновенно), срок аренды окна воркером в секундах и количество окон в одной аренде.
+QUEUE_WINDOW_MINUTES = int(os.environ.get('QUEUE_WINDOW_MINUTES', 60))
+QUEUE_SETTLE_MINUTES = int(os.environ.get('QUEUE_SETTLE_MINUTES', 15))
+LEASE_TIMEOUT = int(os.environ.get('LEASE_TIMEOUT', 900))
+LEASE_BATCH = int(os.environ.get('LEASE_BATCH', 8))
+
+# Метрики (см. metrics.py): порт HTTP-сервера с адресом /metrics (0 - не запускать)
+# и адрес Prometheus Pushgateway, куда метрики отправляются после каждого запуска (пусто - не отправлять).
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
+METRICS_PUSH_URL = os.environ.get('METRICS_PUSH_URL', '')
+
+# Поиск дубликатов вакансий (db.dedup): длина сигнатуры MinHash, количество полос LSH
+# (длина сигнатуры должна делиться на него), порог сходства, количество вакансий в пачке
+# и количество процессов для построения сигнатур (1 - в текущем процессе).
+DEDUP_NUM_PERM = int(os.environ.get('DEDUP_NUM_PERM', 64))
+DEDUP_BANDS = int(os.environ.get('DEDUP_BANDS', 16))
+DEDUP_THRESHOLD = float(os.environ.get('DEDUP_THRESHOLD', 0.7))
+DEDUP_BATCH = int(os.environ.get('DEDUP_BATCH', 5000))
+DEDUP_WORKERS = int(os.environ.get('DEDUP_WORKERS', 1))
+
+# Сервис чтения вакансий (api.app): адрес, размер страницы по умолчанию и наибольший,
+# размер кеша ответов и время жизни ответа в секундах.
+API_HOST = os.environ.get('API_HOST', '0.0.0.0')
+API_PORT = int(os.environ.get('API_PORT', 8080))
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 500))
+API_CACHE_SIZE = int(os.environ.get('API_CACHE_SIZE', 1024))
+API_CACHE_TTL = int(os.environ.get('API_CACHE_TTL', 300))
@@ -1,7 +1,9 @@
 from celery import Celery
 
+import settings
 
-app = Celery('task', include=['task.tasks'])
+
+app = Celery('task', include=['task.tasks'], backend=settings.CELERY_RESULT_BACKEND)
 
 
 if __name__ == '__main__':
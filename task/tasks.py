@@ -1,10 +1,22 @@
 import asyncio
+from datetime import datetime, timedelta
 
+from celery import chord
 from celery.schedules import crontab
+from celery.signals import worker_process_shutdown
 
+import settings
+from db.database import DataBase
+from db.dedup import Deduplicator
+from db.pool import close_pool
+from db.seen import SeenFilter
+from logger import stop_logging
 from vacancy_parser.parseHH import ParserHH
 from vacancy_parser.parseRR import ParserRR
 from vacancy_parser.parseSJ import ParserSJ
+from vacancy_parser.base_parser import region_scope
+from vacancy_parser.orchestrator import Orchestrator, PARSERS
+from vacancy_parser.windows import split_period
 from task._celery import app
 
 
@@ -12,39 +24,191 @@ period = 60
 
 
 @app.task
-def parse_hh(period):
+def parse_hh(period=period, backfill=False):
+    """
+    По расписанию ищет вакансии во всех регионах источника (settings.REGIONS)
+    начиная с водяного знака региона, с backfill=True - за весь период (в днях).
+    """
     loop = asyncio.get_event_loop()
-    # hh = ParserHH(minutes=time_between_parse).start_parse()
-    hh = ParserHH(days=period).start_parse()
-    loop.run_until_complete(hh)
+    hh = Orchestrator([ParserHH.source], serve_metrics=False).run(days=period, incremental=not backfill)
+    return loop.run_until_complete(hh)
 
 
 @app.task
-def parse_sj(period):
+def parse_sj(period=period, backfill=False):
     loop = asyncio.get_event_loop()
-    # sj = ParserSJ(minutes=time_between_parse).start_parse()
-    sj = ParserSJ(days=period).start_parse()
-    loop.run_until_complete(sj)
+    sj = Orchestrator([ParserSJ.source], serve_metrics=False).run(days=period, incremental=not backfill)
+    return loop.run_until_complete(sj)
 
 
 @app.task
-def parse_rr(period):
+def parse_rr(period=period, backfill=False):
+    # rabota.ru не поддерживает поиск по дате, поэтому всегда обходит всю выдачу
     loop = asyncio.get_event_loop()
     rr = ParserRR().start_parse()
     loop.run_until_complete(rr)
 
 
+@app.task
+def parse_all(period=period, backfill=False, sources=None):
+    """
+    Обходит все источники одновременно в одном цикле событий и возвращает сводку запуска.
+    """
+    loop = asyncio.get_event_loop()
+    run = Orchestrator(sources).run(days=period, incremental=not backfill)
+    return loop.run_until_complete(run)
+
+
+@app.task
+def parse_period(source, period=period, backfill=False):
+    """
+    Распределенный обход источника: период каждого региона делится на шарды
+    по settings.SHARD_HOURS часов, каждый шард выгружается отдельной задачей parse_shard
+    на любом свободном воркере, после завершения всех шардов региона summarize_shards
+    подводит итог и сохраняет водяной знак региона.
+    Источник без поиска по дате (rabota.ru) обходится одной задачей.
+
+    Ограничения частоты запросов (settings.RATE_LIMITS) действуют в пределах процесса,
+    поэтому при большом количестве воркеров их стоит уменьшить пропорционально.
+
+    Возвращает:
+    словарь с id задачи summarize_shards для каждого региона, по которому можно получить сводку.
+    """
+    if not PARSERS[source].date_search:
+        parser = PARSERS[source](days=period, incremental=not backfill)
+        asyncio.get_event_loop().run_until_complete(parser.start_parse())
+        return None
+    summaries = {}
+    for parser in PARSERS[source].for_regions(days=period, incremental=not backfill):
+        shards = split_period(parser.time_end, parser.time_to, timedelta(hours=settings.SHARD_HOURS))
+        header = [parse_shard.s(source, time_from.isoformat(), time_to.isoformat(), parser.region)
+                  for time_from, time_to in shards]
+        summaries[parser.scope] = chord(header)(summarize_shards.s(source, parser.region)).id
+    return summaries
+
+
+@app.task
+def parse_shard(source, time_from, time_to, region=None):
+    """
+    Выгружает вакансии региона источника за один шард периода и возвращает отчет о запуске.
+    """
+    time_from = datetime.fromisoformat(time_from)
+    time_to = datetime.fromisoformat(time_to)
+    # снимок фильтра общий для всех запусков источника, шард наполняет фильтр только из базы данных
+    parser = PARSERS[source](minutes=(time_to - time_from).total_seconds() / 60, time_to=time_to,
+                             seen=SeenFilter(), region=region)
+    parser.seen.load(parser.db, parser.seen_since)
+    loop = asyncio.get_event_loop()
+    return loop.run_until_complete(parser.start_shard())
+
+
+@app.task
+def summarize_shards(reports, source, region=None):
+    """
+    Принимает:
+    отчеты всех шардов (см. Parser.start_shard),
+    наименование источника и id региона.
+
+    Назначение:
+    сложить количество запросов, вакансий и неудачных окон и сохранить водяной знак:
+    дату самой свежей вакансии, но не дальше самого раннего окна, которое не удалось получить.
+    Если хотя бы один пакет вакансий не записан, водяной знак не сдвигается.
+
+    Возвращает:
+    сводку распределенного обхода.
+    """
+    summary = {
+        'source': source,
+        'region': region,
+        'shards': len(reports),
+        'duration': max((report['duration'] for report in reports), default=0),
+        'requests': sum(report['requests'] for report in reports),
+        'retries': sum(report['retries'] for report in reports),
+        'rows': sum(report['rows'] for report in reports),
+        'updated': sum(report['updated'] for report in reports),
+        'failed': sum(report['failed'] for report in reports),
+        'errors': [report['error'] for report in reports if report['error']],
+    }
+    published = [datetime.fromisoformat(report['last_published'])
+                 for report in reports if report['last_published']]
+    failed_from = [datetime.fromisoformat(report['failed_from'])
+                   for report in reports if report['failed_from']]
+    if published and not any(report['write_errors'] for report in reports):
+        watermark = min([max(published)] + failed_from)
+        DataBase().set_watermark(region_scope(source, region), watermark)
+        summary['watermark'] = watermark.isoformat()
+    return summary
+
+
+@app.task
+def crawl_queue(source, period=period):
+    """
+    По расписанию добавляет в очередь окон новые окна каждого региона источника за период (в днях)
+    и выгружает свободные окна, регионы - одновременно. Если предыдущий запуск еще работает,
+    оба запуска делят оставшиеся окна, а не выгружают одни и те же.
+    """
+    loop = asyncio.get_event_loop()
+    crawl = Orchestrator([source], serve_metrics=False).run(start='start_queue', days=period)
+    return loop.run_until_complete(crawl)
+
+
+@app.task
+def refetch_failed(source):
+    """
+    Повторно запрашивает окна и страницы всех регионов источника, которые не удалось получить ранее.
+    """
+    loop = asyncio.get_event_loop()
+    refetch = Orchestrator([source], serve_metrics=False).run(start='refetch_failed')
+    return loop.run_until_complete(refetch)
+
+
+@app.task
+def dedup_vacancies():
+    """
+    Назначает группы дубликатов вакансиям, записанным после предыдущего запуска (см. db.dedup).
+    """
+    return Deduplicator().run()
+
+
+@worker_process_shutdown.connect
+def close_db_pool(**kwargs):
+    # пул соединений живет все время работы процесса воркера и переиспользуется задачами
+    close_pool()
+    stop_logging()
+
+
 app.conf.beat_schedule = {
     'scrapping-_hh': {
-        'task': 'task.tasks.parse_hh',
-        'schedule': crontab(minute=f'*/{period}')
+        'task': 'task.tasks.crawl_queue',
+        'schedule': crontab(minute=f'*/{period}'),
+        'args': (ParserHH.source,)
     },
     'scrapping-_sj': {
-        'task': 'task.tasks.parse_sj',
-        'schedule': crontab(minute=f'*/{period}')
+        'task': 'task.tasks.crawl_queue',
+        'schedule': crontab(minute=f'*/{period}'),
+        'args': (ParserSJ.source,)
     },
     'scrapping-_rr': {
         'task': 'task.tasks.parse_rr',
         'schedule': crontab(minute=f'*/{period}')
     },
+    'refetch-failed-_hh': {
+        'task': 'task.tasks.refetch_failed',
+        'schedule': crontab(minute=f'*/{period}'),
+        'args': (ParserHH.source,)
+    },
+    'refetch-failed-_sj': {
+        'task': 'task.tasks.refetch_failed',
+        'schedule': crontab(minute=f'*/{period}'),
+        'args': (ParserSJ.source,)
+    },
+    'refetch-failed-_rr': {
+        'task': 'task.tasks.refetch_failed',
+        'schedule': crontab(minute=f'*/{period}'),
+        'args': (ParserRR.source,)
+    },
+    'dedup-vacancies': {
+        'task': 'task.tasks.dedup_vacancies',
+        'schedule': crontab(minute=f'*/{period}')
+    },
 }
@@ -1,26 +1,34 @@
+import asyncio
+import json
+import math
+import os
+import socket
 import time
 from datetime import datetime, timedelta
 
-from functools import wraps
 from abc import ABC, abstractmethod
 
+import aiohttp
+
+from metrics import Metrics
 from db.database import DataBase
+from db.seen import SeenFilter
+from db.writer import AsyncWriter
+from vacancy_parser.concurrency import AdaptiveLimiter
+from vacancy_parser.http import NETWORK_ERRORS, CircuitBreaker, RetryPolicy
+from vacancy_parser.pipeline import Pipeline
+from vacancy_parser.rate_limit import RateLimiter
+from vacancy_parser.windows import WindowPlanner, grid_windows
 from logger import write_logs
+import settings
 
 
-def duration(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        """
-        Декоратор для измерения времени работы парсера.
-        """
-        start = time.time()
-        result = func(*args, **kwargs)
-        duration_program = time.time() - start
-        print(f'Время работы составило {duration_program}')
-        return result
-
-    return wrapper
+def region_scope(source, region=None):
+    """
+    Возвращает ключ, под которым хранятся водяной знак, очередь окон и dead_letters
+    региона источника: наименование источника либо "источник:регион".
+    """
+    return source if region is None else f'{source}:{region}'
 
 
 class Parser(ABC):
@@ -30,88 +38,577 @@ class Parser(ABC):
     Принимает:
     количество дней либо часов, либо минут, за которые необходимо найти вакансии,
     логгер, куда записываются логи и ошибки,
-    базу данных, куда пишется вся информация о вакансиях.
+    базу данных, куда пишется вся информация о вакансиях,
+    фоновый писатель, через который вакансии попадают в базу данных
+    (может быть общим для нескольких парсеров),
+    признак инкрементального поиска,
+    конец периода поиска (по умолчанию текущее время),
+    кассету, в которую записываются все ответы (см. vacancy_parser.replay),
+    фильтр уже записанных вакансий (см. db.seen.SeenFilter),
+    id региона в API источника (None - без ограничения по региону).
+
+    Метрики запуска (задержка запросов, байты, страницы, время разбора и записи)
+    собираются в self.metrics (см. metrics.Metrics) и входят в отчет report.
 
     Назначение:
     определить набор методов, который должны быть у дочерних классов.
+    Источник реализует обход (parse) и извлечение одной вакансии (extract),
+    разбор страниц и запись вакансий общие для всех источников (см. write_page).
+
+    Окна поиска выгружаются конвейером (см. parse_windows и vacancy_parser.pipeline):
+    окна -> запрос и разбор страниц -> запись, этапы связаны ограниченными очередями.
+    Поэтому в памяти одновременно находится ограниченное количество страниц
+    при любой длине периода, а медленная запись в базу данных (см. AsyncWriter.max_pending)
+    приостанавливает запросы.
+
+    Вакансии, которые уже записаны в базу данных в том же виде, отбрасываются фильтром seen
+    до записи, изменившиеся вакансии база данных обновляет (см. DataBase.write_many);
+    фильтр наполняется вакансиями окна поиска плюс seen_warm_days дней.
+
+    Запросы выполняются методом fetch: с повторами по RetryPolicy и через общий
+    для хоста предохранитель (CircuitBreaker). Окна и страницы, которые так и не удалось
+    получить, записываются в таблицу dead_letters, откуда их повторно запрашивает
+    refetch_failed, не перезапуская поиск за весь период.
+
+    Регионы источника (settings.REGIONS) обходятся отдельными парсерами (см. for_regions),
+    которые работают одновременно и делят ограничения хоста: частоту запросов (RateLimiter),
+    количество подключений (AdaptiveLimiter) и предохранитель (CircuitBreaker).
+    Наибольшая длина окна поиска задается для каждого региона. Водяной знак, очередь окон,
+    dead_letters и метрики хранятся отдельно для каждого региона (см. region_scope),
+    фильтр seen общий для источника: его наполняет и сохраняет тот, кто его создал,
+    один раз для всех регионов (см. Orchestrator).
+
+    При инкрементальном поиске (incremental=True) вакансии ищутся не за весь период,
+    а начиная с водяного знака источника - даты самой свежей записанной вакансии
+    за вычетом watermark_overlap минут. После успешного поиска водяной знак сдвигается
+    на дату самой свежей найденной вакансии, но не дальше начала первого окна,
+    которое не удалось получить.
     """
-    search_interval = 30
+    source = None  # наименование источника вакансий, вместе с регионом используется для водяного знака
+    host = None  # хост, к которому обращается парсер, используется для ограничения частоты запросов
+    search_interval = 30  # фиксированный интервал поиска, с которым сравнивается план окон, в минутах
+    min_search_interval = 1  # минимальная длина окна поиска, в минутах
+    max_search_interval = 360  # начальная (максимальная) длина окна поиска, в минутах
+    search_cap = None  # ограничение API на количество результатов одного поиска
+    per_page = 100  # количество результатов на странице
+    watermark_overlap = settings.WATERMARK_OVERLAP  # перекрытие с предыдущим поиском, в минутах
+    seen_warm_days = 1  # насколько раньше начала периода наполнять фильтр записанных вакансий, в днях
+    initial_concurrency = 10  # начальное количество одновременных подключений
+    max_concurrency = None  # верхняя граница одновременных подключений, по умолчанию из settings.SOURCE_CONCURRENCY
+    date_search = True  # поддерживает ли источник поиск по дате: только такой период можно делить на шарды
+    region_param = None  # параметр запроса с id региона; None - источник не ищет по регионам
+    window_workers = settings.PIPELINE_WINDOW_WORKERS  # количество окон поиска, которые проверяются одновременно
+    queue_size = settings.PIPELINE_QUEUE_SIZE  # наибольшее количество заданий этапа конвейера
 
-    def __init__(self, days=None, hours=None, minutes=None, logger=None, db=None):
+    session_factory = aiohttp.ClientSession  # для воспроизведения подменяется на ReplaySession
+
+    def __init__(self, days=None, hours=None, minutes=None, logger=None, db=None, writer=None,
+                 incremental=False, time_to=None, cassette=None, seen=None, region=None):
+        self.region = region if self.region_param else None
+        self.scope = region_scope(self.source, self.region)
+        if self.region is not None:
+            # ключи settings.REGIONS - строки, а регион может быть передан числом
+            self.max_search_interval = settings.REGIONS.get(self.source, {}).get(
+                str(self.region), settings.REGION_WINDOW_MINUTES)
         self.logger = logger or write_logs(self.__class__)
         self.db = db or DataBase()
-        self.time_from = datetime.now() - timedelta(minutes=self.search_interval)
-        self.time_to = datetime.now()
-        self.time_end = datetime.now() - timedelta(
+        self.writer = writer or AsyncWriter(self.db, self.logger)
+        self.owns_writer = writer is None  # общий писатель останавливает тот, кто его создал
+        self.inserted = 0  # количество добавленных в базу данных вакансий
+        self.updated = 0  # количество вакансий, изменения которых записаны в базу данных
+        self.write_errors = 0  # количество пакетов вакансий, которые не удалось записать
+        self.limiter = RateLimiter.for_host(self.host)
+        self.breaker = CircuitBreaker.for_host(self.host)
+        self.retry = RetryPolicy()
+        self.concurrency = None  # AdaptiveLimiter, создается на каждый запуск
+        self.metrics = Metrics(self.source, self.region)
+        self.requests = 0  # количество выполненных запросов
+        self.retries = 0  # количество повторных запросов
+        self.last_published = None  # дата самой свежей найденной вакансии
+        self.failed = []  # окна и страницы (начало, конец, страница), которые не удалось получить
+        self.failed_from = None  # начало самого раннего окна, которое не удалось получить
+        self.dead_letters = 0  # количество окон и страниц, записанных в dead_letters
+        self.cassette = cassette
+        self.seen = seen or SeenFilter(os.path.join(settings.SEEN_DIR, f'{self.source}.seen'))
+        self.owns_seen = seen is None  # общий фильтр сохраняет тот, кто его создал (см. Orchestrator)
+        self.duration = None  # время работы парсера в секундах
+        self.stages = {}  # сводка этапов конвейеров запуска (см. track_pipeline)
+        self.coverage = {}  # сводка окон поиска запуска (см. WindowPlanner.stats)
+        self.time_to = time_to or datetime.now()
+        self.time_end = self.time_to - timedelta(
             days=days or 0, hours=hours or 0, minutes=minutes or 0
         )
+        if incremental:
+            watermark = self.db.get_watermark(self.scope)
+            if watermark is not None:
+                self.time_end = max(self.time_end, watermark - timedelta(minutes=self.watermark_overlap))
 
-    @abstractmethod
-    def start_parse(self):
+    @property
+    def seen_since(self):
+        """
+        Возвращает дату, начиная с которой фильтр seen наполняется записанными вакансиями.
+        """
+        return self.time_end - timedelta(days=self.seen_warm_days)
+
+    @classmethod
+    def for_regions(cls, regions=None, **kwargs):
+        """
+        Принимает:
+        id регионов (по умолчанию из settings.REGIONS),
+        параметры, с которыми создаются парсеры.
+
+        Возвращает:
+        список парсеров, по одному на регион; один парсер без региона,
+        если источник не ищет по регионам или регионы для него не заданы.
+        """
+        if cls.region_param:
+            regions = regions or list(settings.REGIONS.get(cls.source, ()))
+        return [cls(region=region, **kwargs) for region in regions or [None]]
+
+    async def start_parse(self):
         """
         Запускает работу парсера.
         """
-        pass
+        await self.run(self.parse)
+        self.save_watermark()
+        self.logger.info(f'Run report: {self.report()}')
 
-    @abstractmethod
-    def get_vacancy_id(self, vacancy):
+    async def start_shard(self):
         """
-        Обрабатывает входящие данные и возвращает id вакансии.
+        Запускает обход одного шарда периода (см. task.tasks.parse_period).
+        Водяной знак не сохраняется: его сохраняет сводная задача после завершения всех шардов.
+        Ошибка обхода не прерывает задачу: весь шард записывается в dead_letters.
+
+        Возвращает:
+        отчет о запуске (см. report) с датой самой свежей найденной вакансии,
+        началом самого раннего окна, которое не удалось получить, и количеством ошибок записи.
         """
-        pass
+        error = None
 
-    @abstractmethod
-    def get_salary(self, vacancy):
+        async def crawl():
+            nonlocal error
+            try:
+                await self.parse()
+            except Exception as e:
+                error = repr(e)
+                self.logger.error(f'Not parsed shard {self.time_end} - {self.time_to}: {e}')
+                self.mark_failed(self.time_end, self.time_to)
+
+        await self.run(crawl)
+        report = self.report()
+        report.update(
+            last_published=self.last_published.isoformat() if self.last_published else None,
+            failed_from=self.failed_from.isoformat() if self.failed_from else None,
+            write_errors=self.write_errors,
+            error=error,
+        )
+        return report
+
+    async def start_queue(self):
         """
-        Обрабатывает входящие данные и возвращает зарплату (от, до и валюту).
+        Запускает обход источника через очередь окон (таблица work_queue):
+        добавляет в очередь закончившиеся окна периода и выгружает арендованные окна,
+        пока в очереди есть свободные. Несколько одновременных запусков делят окна между собой.
+        Длина окна очереди у региона - его наибольшая длина окна поиска (см. settings.REGIONS),
+        у источника без регионов - settings.QUEUE_WINDOW_MINUTES.
         """
-        pass
+        minutes = self.max_search_interval if self.region is not None else settings.QUEUE_WINDOW_MINUTES
+        interval = timedelta(minutes=minutes)
+        settled = datetime.now() - timedelta(minutes=settings.QUEUE_SETTLE_MINUTES)
+        windows = grid_windows(self.time_end, min(self.time_to, settled), interval)
+        added = self.db.enqueue_windows(self.scope, windows, self.time_end)
+        self.logger.info(f'Enqueued {added} of {len(windows)} windows')
+        await self.run(self.parse_queue)
+        self.logger.info(f'Run report: {self.report()}')
 
-    @abstractmethod
-    def get_vacancy_url(self, vacancy):
+    async def parse_queue(self):
         """
-        Обрабатывает входящие данные и возвращает url вакансии.
+        Арендует окна очереди пачками по settings.LEASE_BATCH и выгружает их.
+        Окно отмечается выполненным только после записи его вакансий в базу данных;
+        окна, которые не удалось выгрузить или записать, возвращаются в очередь.
+        Отдельные страницы и части окна, которые не удалось получить, как обычно
+        попадают в dead_letters и не мешают выполнить окно. Окна, которые не удалось
+        выполнить за DataBase.lease_attempts аренд, база данных переносит в dead_letters.
+        Пока окна выгружаются, их аренда продлевается (см. renew_leases).
         """
-        pass
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        while True:
+            leases, exhausted = self.db.claim_windows(self.scope, settings.LEASE_BATCH,
+                                                      settings.LEASE_TIMEOUT, worker)
+            if exhausted:
+                self.dead_letters += exhausted
+                self.logger.error(f'{exhausted} windows exceeded lease attempts and moved to dead letters')
+            if not leases:
+                break
+            write_errors = self.write_errors
+            renewal = asyncio.create_task(self.renew_leases([lease_id for lease_id, _, _ in leases], worker))
+            try:
+                results = await asyncio.gather(*(self.parse_windows(time_from, time_to)
+                                                 for _, time_from, time_to in leases),
+                                               return_exceptions=True)
+                await self.writer.flush()
+            finally:
+                renewal.cancel()
+            done, released = [], []
+            not_written = self.write_errors > write_errors
+            for (lease_id, time_from, time_to), result in zip(leases, results):
+                if isinstance(result, Exception) or not_written:
+                    error = result if isinstance(result, Exception) else 'vacancies not written'
+                    self.logger.error('Not parsed window %s - %s: %s', time_from, time_to, error)
+                    released.append(lease_id)
+                else:
+                    done.append(lease_id)
+            self.db.complete_windows(done, released)
 
-    @abstractmethod
-    def get_description(self, vacancy):
+    async def renew_leases(self, leases, worker):
         """
-        Обрабатывает входящие данные и возвращает краткое описание вакансии.
+        Продлевает аренду окон каждую треть settings.LEASE_TIMEOUT, пока задача не отменена:
+        окно, которое выгружается дольше срока аренды, не достается другому воркеру.
         """
-        pass
+        while True:
+            await asyncio.sleep(settings.LEASE_TIMEOUT / 3)
+            try:
+                self.db.renew_windows(leases, settings.LEASE_TIMEOUT, worker)
+            except Exception as e:
+                self.logger.error(f'Leases not renewed: {e}')
 
-    @abstractmethod
-    def get_company_name(self, vacancy):
+    async def refetch_failed(self):
         """
-        Обрабатывает входящие данные и возвращает наименование работодателя.
+        Повторно запрашивает окна и страницы источника из таблицы dead_letters.
         """
-        pass
+        await self.run(self.refetch_dead_letters)
 
-    @abstractmethod
-    def get_title(self, vacancy):
+    async def run(self, crawl):
         """
-        Обрабатывает входящие данные и возвращает название вакансии.
+        Принимает:
+        корутинную функцию обхода источника.
+
+        Назначение:
+        открыть сессию и фоновый писатель, выполнить обход, дождаться записи
+        всех вакансий и сохранить окна и страницы, которые не удалось получить.
         """
-        pass
+        if self.cassette is not None:
+            self.cassette.write_meta(time_end=self.time_end, time_to=self.time_to)
+        started = time.perf_counter()
+        if self.owns_seen:
+            self.seen.load(self.db, self.seen_since)
+        maximum = self.max_concurrency or settings.SOURCE_CONCURRENCY.get(self.source, self.initial_concurrency)
+        # регионы источника, обходимые одновременно, делят одно ограничение подключений к хосту
+        self.concurrency = AdaptiveLimiter.for_host(self.host, self.initial_concurrency, maximum)
+        self.writer.start()
+        try:
+            async with self.session_factory() as self.session:
+                await crawl()
+        finally:
+            self.concurrency.detach()
+            await self.finish_writing()
+            self.duration = time.perf_counter() - started
+            if self.owns_seen and not self.write_errors:
+                self.seen.save()
+            if self.failed:
+                self.db.write_dead_letters(self.scope, self.failed)
+                self.dead_letters += len(self.failed)
+                self.failed = []
+            await self.push_metrics()
 
-    @abstractmethod
-    def get_vacancy_format(self, vacancy):
+    async def push_metrics(self):
         """
-        Обрабатывает входящие данные и возвращает формат работы.
+        Отправляет метрики запуска в Prometheus Pushgateway, если он задан в настройках.
+        Ошибка отправки не влияет на результат запуска.
         """
-        pass
+        if not settings.METRICS_PUSH_URL:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.metrics.push)
+        except OSError as e:
+            self.logger.error(f'Metrics not pushed: {e}')
+
+    async def finish_writing(self):
+        """
+        Дожидается записи всех вакансий парсера. Собственный писатель при этом
+        останавливается, общий продолжает работать для остальных парсеров.
+        """
+        if self.owns_writer:
+            await self.writer.close()
+        else:
+            await self.writer.flush()
 
     @abstractmethod
-    def get_city_vacancy(self, vacancy):
+    async def parse(self):
         """
-        Обрабатывает входящие данные и возвращает город, в которой расположена вакансия.
+        Обходит источник и передает найденные вакансии фоновому писателю.
         """
         pass
 
+    async def refetch(self, time_from, time_to, page):
+        """
+        Повторно запрашивает окно поиска (page is None) либо одну страницу окна.
+        """
+        if page is None:
+            await self.parse_windows(time_from, time_to)
+        else:
+            await self.get_page(time_from, time_to, page)
+
+    async def get_page(self, time_from, time_to, page):
+        """
+        Запрашивает одну страницу окна поиска и передает ее вакансии на запись.
+        """
+        resp = await self.get_response(time_from, time_to, page)
+        if resp:
+            await self.save_vacancies(resp)
+        else:
+            self.mark_failed(time_from, time_to, page)
+
+    async def refetch_dead_letters(self):
+        """
+        Назначение:
+        по очереди запросить окна и страницы из таблицы dead_letters.
+
+        Записи, запрос которых прошел без ошибок, отмечаются обработанными,
+        у остальных увеличивается счетчик попыток.
+        """
+        resolved, failed = [], []
+        for letter_id, time_from, time_to, page in self.db.get_dead_letters(self.scope):
+            failures = len(self.failed)
+            await self.refetch(time_from, time_to, page)
+            if len(self.failed) == failures:
+                resolved.append(letter_id)
+            else:
+                del self.failed[failures:]  # запись уже есть в таблице, новая не нужна
+                failed.append(letter_id)
+        await self.finish_writing()
+        if self.write_errors:
+            failed, resolved = failed + resolved, []
+        self.db.update_dead_letters(resolved, failed)
+
+    async def fetch(self, url, params=None, headers=None, text=False):
+        """
+        Принимает:
+        url и параметры запроса,
+        признак чтения ответа как текста (по умолчанию ответ разбирается как json).
+
+        Назначение:
+        выполнить запрос с ограничением количества подключений и частоты запросов.
+        При ошибке сети, ответе 429 или 5xx запрос повторяется с экспоненциальной
+        задержкой, как и при ответе, который не удалось разобрать (например, html-странице капчи);
+        пока предохранитель хоста разомкнут, запрос сразу завершается неудачей.
+        Задержка и ошибки ответов передаются ограничителю подключений (AdaptiveLimiter).
+
+        Возвращает:
+        ответ сервера либо None, если его не удалось получить.
+        """
+        error = None
+        for attempt in range(self.retry.attempts):
+            if attempt:
+                self.retries += 1
+                self.metrics.inc('retries')
+                await asyncio.sleep(self.retry.delay(attempt))
+            if not self.breaker.allow():
+                error = f'circuit breaker for {self.host} is open'
+                break
+            async with self.concurrency:
+                await self.limiter.acquire()
+                self.requests += 1
+                self.metrics.inc('requests')
+                started = time.monotonic()
+                try:
+                    async with self.session.get(url, params=params, headers=headers) as response:
+                        if self.limiter.update(response) or self.retry.is_retryable(response.status):
+                            error = f'status {response.status}'
+                            self.concurrency.backoff()
+                        elif response.status >= 400:
+                            self.concurrency.success(time.monotonic() - started)
+                            self.breaker.success()
+                            self.logger.error('Not parsed %s %s: status %s', url, params, response.status)
+                            return
+                        else:
+                            raw = await response.read()
+                            latency = time.monotonic() - started
+                            self.metrics.observe('request_seconds', latency)
+                            self.metrics.inc('bytes', len(raw))
+                            body = raw.decode(response.get_encoding()) if text or self.cassette else None
+                            if self.cassette is not None:
+                                self.cassette.record(url, params, response.status, body)
+                            result = body if text else json.loads(raw)
+                            self.concurrency.success(latency)
+                            self.breaker.success()
+                            return result
+                except NETWORK_ERRORS as err:
+                    error = err
+                    self.concurrency.backoff()
+                except ValueError as err:
+                    # ответ 200 не в json либо не в своей кодировке: капча или html-страница ошибки
+                    error = f'invalid response body: {err!r}'
+                    self.concurrency.backoff()
+            self.breaker.failure()
+        self.metrics.inc('errors')
+        self.logger.error('Not parsed %s %s: %s', url, params, error)
+
+    async def parse_windows(self, time_from=None, time_to=None):
+        """
+        Принимает:
+        начало и конец периода (по умолчанию весь период парсера).
+
+        Назначение:
+        выгрузить вакансии за период, разбив его на окна адаптивно (см. WindowPlanner).
+
+        Окна выгружаются конвейером из двух этапов перед фоновым писателем:
+        windows - window_workers обработчиков вызывают get_number_pages, возвращающий
+        количество вакансий в окне и первую страницу ответа, и делят переполненные окна;
+        pages - страницы окон, уложившихся в ограничение API, запрашивают (get_page)
+        столько обработчиков, сколько допускает ограничитель подключений.
+        Ответ разбирается сразу после получения, поэтому дальше страницы ждут записи
+        только компактные Vacancy; медленная запись (см. AsyncWriter.max_pending)
+        приостанавливает обработчики, а через очередь pages (не больше queue_size страниц) - и окна.
+        Очередь windows не ограничена: в ней только границы окон.
+        По окончании в лог записывается количество запланированных и выполненных запросов.
+        """
+        time_from = time_from or self.time_end
+        time_to = time_to or self.time_to
+        pipeline = Pipeline(self.logger)
+
+        async def fetch_window(window_from, window_to, found, first_page):
+            numbers = range(self.count_pages(found))
+            if first_page is not None:
+                await self.save_vacancies(first_page)
+                del first_page  # первая страница разобрана и больше не нужна
+                numbers = numbers[1:]
+            for page in numbers:
+                await pages.put((window_from, window_to, page))
+
+        async def plan_window(window):
+            for part in await planner.process(*window):
+                await windows.put(part)
+
+        planner = WindowPlanner(self.get_number_pages, fetch_window,
+                                self.search_cap, self.per_page,
+                                self.min_search_interval, self.max_search_interval,
+                                self.logger)
+        windows = pipeline.stage('windows', plan_window, self.window_workers, 0)
+        pages = pipeline.stage('pages', lambda job: self.get_page(*job),
+                               self.concurrency.maximum, self.queue_size)
+        try:
+            await pipeline.run(planner.windows(time_from, time_to))
+        finally:
+            self.track_pipeline(pipeline)
+        self.metrics.inc('windows', planner.stats['windows'])
+        for key, value in planner.stats.items():
+            self.coverage[key] = self.coverage.get(key, 0) + value
+        for window_from, window_to in planner.failed:
+            self.mark_failed(window_from, window_to)
+        # запросы этого периода (пробы окон и страницы), без повторов: счетчик self.requests общий
+        # для всех окон запуска, в том числе выгружаемых одновременно (см. parse_queue)
+        executed = planner.stats['probes'] + pages.processed
+        self.logger.info(planner.report(time_from, time_to, self.search_interval, executed))
+
+    def track_pipeline(self, pipeline):
+        """
+        Добавляет в сводку stages количество заданий, обработанных этапами конвейера,
+        и наибольшую длину их очередей.
+        """
+        for name, stats in pipeline.stats().items():
+            stage = self.stages.setdefault(name, {'processed': 0, 'max_queued': 0})
+            stage['processed'] += stats['processed']
+            stage['max_queued'] = max(stage['max_queued'], stats['max_queued'])
+
+    def report(self):
+        """
+        Возвращает сводку последнего запуска: время работы, количество запросов,
+        добавленных и обновленных вакансий, а также их количество в секунду,
+        текущее и наибольшее количество одновременных подключений к хосту (общее для регионов),
+        сводку окон поиска и этапов конвейера и метрики запуска.
+        """
+        duration = self.duration or 0
+        report = {
+            'source': self.source,
+            'region': self.region,
+            'duration': round(duration, 3),
+            'requests': self.requests,
+            'retries': self.retries,
+            'rows': self.inserted,
+            'updated': self.updated,
+            'failed': self.dead_letters,
+            'seen_hits': self.seen.hits,
+            'seen_hit_rate': self.seen.hit_rate,
+            'requests_per_sec': round(self.requests / duration, 1) if duration else None,
+            'rows_per_sec': round(self.inserted / duration, 1) if duration else None,
+        }
+        if self.concurrency is not None:
+            report.update(self.concurrency.stats())
+        if self.coverage:
+            report['coverage'] = {'from': self.time_end.isoformat(), 'to': self.time_to.isoformat(),
+                                  **self.coverage}
+        if self.stages:
+            report['stages'] = self.stages
+        report['metrics'] = self.metrics.to_dict()
+        return report
+
+    async def write_page(self, items):
+        """
+        Принимает:
+        вакансии страницы в формате источника.
+
+        Назначение:
+        извлечь из каждой вакансии Vacancy (см. extract) и передать их фоновому писателю одним пакетом.
+        В очередь на запись попадают только компактные Vacancy, поэтому ответ API
+        освобождается сразу после разбора, а не после записи в базу данных.
+        """
+        with self.metrics.timer('parse_seconds'):
+            records = [self.extract(raw) for raw in items]
+        await self.write_vacancies(records)
+
+    async def write_vacancies(self, records):
+        """
+        Передает фоновому писателю вакансии пакета (список Vacancy), которых нет в фильтре seen,
+        и запоминает дату самой свежей вакансии. Ждет, если у писателя уже
+        max_pending пакетов не записаны.
+        """
+        if not records:
+            return
+        published = max(record.date for record in records)
+        if self.last_published is None or published > self.last_published:
+            self.last_published = published
+        new = self.seen.filter(records)
+        self.metrics.inc('pages')
+        self.metrics.inc('rows_skipped_seen', len(records) - len(new))
+        await self.writer.write(new, owner=self)
+
+    def mark_failed(self, time_from=None, time_to=None, page=None):
+        """
+        Запоминает окно поиска либо страницу, которые не удалось получить:
+        они будут записаны в таблицу dead_letters, а водяной знак не сдвинется дальше них.
+        """
+        self.failed.append((time_from, time_to, page))
+        if time_from is not None and (self.failed_from is None or time_from < self.failed_from):
+            self.failed_from = time_from
+
+    def save_watermark(self):
+        """
+        Сохраняет водяной знак источника после успешного поиска.
+        Вызывается после записи всех вакансий в базу данных.
+        """
+        if self.last_published is None or self.write_errors:
+            return
+        watermark = self.last_published
+        if self.failed_from is not None:
+            watermark = min(watermark, self.failed_from)
+        self.db.set_watermark(self.scope, watermark)
+
+    def count_pages(self, found):
+        """
+        Возвращает количество страниц для found вакансий с учетом ограничения API
+        и последней неполной страницы.
+        """
+        if self.search_cap is not None:
+            found = min(found, self.search_cap)
+        return math.ceil(found / self.per_page)
+
     @abstractmethod
-    def get_date_vacancy(self, vacancy):
+    def extract(self, raw):
         """
-        Обрабатывает входящие данные и возвращает дату размещения вакансии.
+        Принимает:
+        одну вакансию в формате источника (объект из ответа API либо элемент html-страницы).
+
+        Возвращает:
+        Vacancy с информацией о вакансии.
         """
-        pass
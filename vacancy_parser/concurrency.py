@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import deque
+
+
+class AdaptiveLimiter:
+    """
+    Адаптивное ограничение количества одновременных запросов к хосту (AIMD).
+
+    Принимает:
+    начальное, минимальное и максимальное количество одновременных запросов,
+    во сколько раз задержка ответа может превысить базовую, прежде чем хост считается перегруженным,
+    множитель уменьшения ограничения.
+
+    Назначение:
+    подбирать количество одновременных запросов по состоянию сервера вместо
+    фиксированного семафора. Пока ответы успешные и быстрые, ограничение растет:
+    сначала на единицу за каждый ответ (удваивается за время ответа, как медленный старт TCP),
+    после первого снижения - на единицу за limit ответов. Ошибка сети, ответ 429 или 5xx
+    и задержка выше базовой в latency_tolerance раз уменьшают ограничение в decrease раз,
+    но не чаще одного раза за время ответа: ошибки одной пачки запросов считаются одной.
+
+    Базовая задержка - наименьшее значение сглаженной задержки за запуск.
+    Ограничитель общий для всех парсеров, одновременно обращающихся к хосту (см. for_host),
+    например, для регионов одного источника: они делят одно ограничение, а не получают каждый свое.
+    Когда хост перестают использовать все парсеры, следующий запуск создает новый ограничитель
+    внутри своего цикла событий, поэтому ограничитель не привязан к циклу событий прошлых запусков.
+    """
+    smoothing = 0.2  # вес нового ответа в сглаженной задержке
+    limiters = {}  # хост -> ограничитель, общий для одновременно работающих парсеров
+
+    def __init__(self, initial, minimum=1, maximum=100, latency_tolerance=3, decrease=0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.latency_tolerance = latency_tolerance
+        self.decrease = decrease
+        self.in_flight = 0  # количество выполняющихся запросов
+        self.waiters = deque()
+        self.slow_start = True  # до первого снижения ограничение растет быстрее
+        self.latency = None  # сглаженная задержка ответа, в секундах
+        self.baseline = None  # наименьшая сглаженная задержка за запуск
+        self.decreased_at = 0  # время последнего снижения ограничения
+        self.peak = int(self.limit)  # наибольшее ограничение за запуск
+        self.decreases = 0  # количество снижений ограничения
+        self.users = 0  # количество парсеров, которые сейчас используют ограничитель
+
+    @classmethod
+    def for_host(cls, host, initial, maximum):
+        """
+        Возвращает ограничитель хоста, общий для всех парсеров, которые сейчас к нему обращаются,
+        либо новый с начальным и максимальным количеством подключений, если таких парсеров нет.
+        После завершения запуска парсер вызывает detach.
+        """
+        limiter = cls.limiters.get(host)
+        if limiter is None or not limiter.users:
+            limiter = cls.limiters[host] = cls(initial, maximum=maximum)
+        limiter.users += 1
+        return limiter
+
+    def detach(self):
+        self.users -= 1
+
+    @property
+    def current(self):
+        return int(self.limit)
+
+    async def __aenter__(self):
+        while self.in_flight >= self.current:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+                self.wake()
+                raise
+        self.in_flight += 1
+
+    async def __aexit__(self, *exc_info):
+        self.in_flight -= 1
+        self.wake()
+
+    def wake(self):
+        free = self.current - self.in_flight
+        while free > 0 and self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def success(self, latency):
+        """
+        Принимает:
+        задержку успешного ответа в секундах.
+
+        Назначение:
+        увеличить ограничение либо уменьшить его, если сервер отвечает заметно медленнее обычного.
+        """
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+        if self.baseline is None or self.latency < self.baseline:
+            self.baseline = self.latency
+        if self.latency > self.baseline * self.latency_tolerance:
+            self.backoff()
+            return
+        self.limit = min(self.maximum, self.limit + (1 if self.slow_start else 1 / self.limit))
+        self.peak = max(self.peak, self.current)
+        self.wake()
+
+    def backoff(self):
+        """
+        Уменьшает ограничение после ошибки, ответа 429 или 5xx.
+        """
+        now = time.monotonic()
+        if now - self.decreased_at < (self.latency or 0):
+            return
+        self.decreased_at = now
+        self.slow_start = False
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self.decreases += 1
+
+    def stats(self):
+        return {
+            'concurrency': self.current,
+            'peak_concurrency': self.peak,
+            'concurrency_decreases': self.decreases,
+        }
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from random import uniform
+
+import aiohttp
+
+import settings
+
+
+# Ошибки сети и протокола, после которых запрос имеет смысл повторить.
+NETWORK_ERRORS = (aiohttp.ServerDisconnectedError,
+                  asyncio.TimeoutError,
+                  aiohttp.ClientPayloadError,
+                  aiohttp.ClientOSError,
+                  aiohttp.ClientConnectorError,
+                  ConnectionAbortedError)
+
+
+class RetryPolicy:
+    """
+    Политика повторов запроса.
+
+    Принимает:
+    максимальное количество попыток,
+    базовую и максимальную паузу между попытками, в секундах.
+
+    Пауза перед попыткой n выбирается случайно от 0 до min(cap, base * 2 ** n)
+    (экспоненциальная задержка с полным случайным разбросом), чтобы повторы
+    одновременно упавших запросов не приходили на сервер одной волной.
+    """
+
+    def __init__(self, attempts=settings.RETRY_ATTEMPTS, base=settings.RETRY_BASE_DELAY,
+                 cap=settings.RETRY_MAX_DELAY):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt):
+        return uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+    @staticmethod
+    def is_retryable(status):
+        return status == 429 or status >= 500
+
+
+class CircuitBreaker:
+    """
+    Предохранитель запросов к одному хосту.
+
+    Принимает:
+    количество ошибок подряд, после которого хост считается недоступным,
+    время (в секундах), на которое запросы к недоступному хосту прекращаются.
+
+    Назначение:
+    не тратить попытки и время на хост, который лежит.
+    После threshold ошибок подряд предохранитель размыкается и запросы сразу
+    завершаются неудачей. По истечении reset_timeout пропускается один пробный запрос:
+    успешный замыкает предохранитель, неудачный снова размыкает его.
+    """
+    breakers = {}
+
+    def __init__(self, threshold=settings.BREAKER_THRESHOLD, reset_timeout=settings.BREAKER_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @classmethod
+    def for_host(cls, host):
+        if host not in cls.breakers:
+            cls.breakers[host] = cls()
+        return cls.breakers[host]
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        """
+        Возвращает True, если запрос к хосту можно выполнить.
+        """
+        if self.opened_at is None:
+            return True
+        if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self.probing = True  # пропускаем один пробный запрос
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import time
+
+import metrics
+import settings
+from db.database import DataBase
+from db.seen import SeenFilter
+from db.writer import AsyncWriter
+from logger import write_logs
+from vacancy_parser.parseHH import ParserHH
+from vacancy_parser.parseRR import ParserRR
+from vacancy_parser.parseSJ import ParserSJ
+
+
+# Зарегистрированные источники вакансий.
+PARSERS = {parser.source: parser for parser in (ParserHH, ParserSJ, ParserRR)}
+
+
+class Orchestrator:
+    """
+    Одновременный запуск парсеров нескольких источников и их регионов в одном цикле событий.
+
+    Принимает:
+    список источников (по умолчанию все зарегистрированные),
+    количество одновременных подключений для каждого источника
+    (по умолчанию settings.SOURCE_CONCURRENCY),
+    логгер,
+    базу данных,
+    id регионов для каждого источника (по умолчанию settings.REGIONS),
+    признак запуска сервера метрик.
+
+    Назначение:
+    обойти все источники одновременно, чтобы общее время работы определялось
+    самым медленным источником, а не суммой времени всех источников.
+    Для каждого региона источника создается отдельный парсер (см. Parser.for_regions);
+    все парсеры пишут вакансии через один общий фоновый писатель, у регионов одного
+    источника общие фильтр seen и ограничения хоста, у разных источников - свои.
+    Падение одного источника или региона не останавливает остальные.
+    Фильтр seen источника наполняется один раз до запуска, начиная с самой ранней даты
+    его регионов, и сохраняется один раз, после завершения всех его регионов
+    и только если все их вакансии записаны: иначе в снимок попали бы вакансии
+    незаписанного пакета другого региона, и они больше никогда не были бы записаны.
+    Если задан settings.METRICS_PORT и serve_metrics=True, на время запуска поднимается
+    сервер метрик (см. metrics.start_server). Задачи Celery одного источника его не поднимают:
+    они запускаются одновременно в разных процессах и отправляют метрики в Pushgateway.
+    """
+
+    def __init__(self, sources=None, concurrency=None, logger=None, db=None, regions=None, serve_metrics=True):
+        self.sources = sources or list(PARSERS)
+        self.regions = regions or {}
+        self.serve_metrics = serve_metrics
+        self.seen = {}  # источник -> фильтр seen, общий для его регионов
+        self.concurrency = {**settings.SOURCE_CONCURRENCY, **(concurrency or {})}
+        self.logger = logger or write_logs(self.__class__)
+        self.db = db or DataBase()
+        self.writer = AsyncWriter(self.db, self.logger)
+
+    def create_parsers(self, **kwargs):
+        parsers = []
+        for source in self.sources:
+            seen = self.seen[source] = SeenFilter(os.path.join(settings.SEEN_DIR, f'{source}.seen'))
+            for parser in PARSERS[source].for_regions(self.regions.get(source), db=self.db, writer=self.writer,
+                                                      seen=seen, **kwargs):
+                if source in self.concurrency:
+                    parser.max_concurrency = self.concurrency[source]
+                parsers.append(parser)
+        return parsers
+
+    async def run(self, start='start_parse', **kwargs):
+        """
+        Принимает:
+        наименование метода парсера, которым запускается обход
+        (start_parse, start_queue либо refetch_failed),
+        параметры, с которыми создаются парсеры (период поиска, incremental и т.д.).
+
+        Назначение:
+        запустить все парсеры одновременно и дождаться записи всех вакансий.
+
+        Возвращает:
+        сводку запуска: отчет каждого парсера (см. Parser.report) с регионом
+        и покрытием периода окнами, общее время работы и суммарное количество запросов и вакансий.
+        """
+        started = time.perf_counter()
+        parsers = self.create_parsers(**kwargs)
+        self.load_seen(parsers)
+        server = await metrics.start_server(logger=self.logger) if self.serve_metrics else None
+        self.writer.start()
+        try:
+            results = await asyncio.gather(*(getattr(parser, start)() for parser in parsers),
+                                           return_exceptions=True)
+        finally:
+            await self.writer.close()
+            if server is not None:
+                await server.cleanup()
+            self.save_seen(parsers)
+        reports = []
+        for parser, result in zip(parsers, results):
+            report = parser.report()
+            if isinstance(result, BaseException):
+                report['error'] = repr(result)
+                self.logger.error(f'Source {parser.scope} failed: {result!r}')
+            reports.append(report)
+        summary = {
+            'duration': round(time.perf_counter() - started, 3),
+            'requests': sum(report['requests'] for report in reports),
+            'rows': sum(report['rows'] for report in reports),
+            'updated': sum(report['updated'] for report in reports),
+            'sources': reports,
+        }
+        self.logger.info(f'Run summary: {summary}')
+        return summary
+
+    def load_seen(self, parsers):
+        """
+        Наполняет фильтр seen каждого источника один раз, начиная с самой ранней даты его регионов.
+        """
+        for source, seen in self.seen.items():
+            seen.load(self.db, min(parser.seen_since for parser in parsers if parser.source == source))
+
+    def save_seen(self, parsers):
+        """
+        Сохраняет фильтр seen каждого источника, если ни у одного его региона нет незаписанных пакетов.
+        """
+        for source, seen in self.seen.items():
+            failed = [parser.scope for parser in parsers if parser.source == source and parser.write_errors]
+            if failed:
+                self.logger.error(f'Seen filter of {source} not saved: write errors in {failed}')
+            else:
+                seen.save()
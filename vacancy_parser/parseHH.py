@@ -1,25 +1,30 @@
 import asyncio
-import aiohttp
 
-from datetime import datetime, timedelta
+from datetime import datetime
 
-from vacancy_parser.base_parser import Parser, duration
+from vacancy_parser.base_parser import Parser
+from vacancy_parser.vacancy import Vacancy
 
 
 class ParserHH(Parser):
     """
     Класс для работы с API hh.ru.
 
-    Принимает количество дней, часов или минут, за которые будет проводиться поиск вакансий.
+    Принимает количество дней, часов или минут, за которые будет проводиться поиск вакансий,
+    и id региона (параметр area, см. settings.REGIONS).
 
     Из-за ограничения количества получаемых результатов в 2000,
-    запросы отправляются с отрезком размещения вакансий 45 минут,
-    что позволяет получить меньше максимального ограничения вакансий в ответе.
+    период поиска разбивается на окна по времени размещения вакансий (см. WindowPlanner),
+    в каждом из которых вакансий меньше максимального ограничения.
 
-    Так же устанавливается ограничение на количество одновременных подключений.
+    Так же количество одновременных подключений подбирается по состоянию API (см. AdaptiveLimiter),
+    а частота запросов ограничивается лимитом API (см. RateLimiter).
     """
-    sem = asyncio.Semaphore(70)
+    source = 'hh'
     url = 'https://api.hh.ru/vacancies'
+    host = 'api.hh.ru'
+    search_cap = 2000
+    region_param = 'area'
 
     async def get_response(self, time_from=None, time_to=None, page=0):
         """
@@ -32,8 +37,8 @@ class ParserHH(Parser):
         Сделать запрос к api и вернуть json ответ.
 
         Формирует параметры, которые будут переданы при запросе,
-        совершает запрос и получает ответ в json формате.
-        Обрабатывает ошибки и записывает их в файл логгирования.
+        совершает запрос (с повторами при ошибках, см. Parser.fetch)
+        и получает ответ в json формате.
 
         Возвращает:
         json ответ.
@@ -43,20 +48,10 @@ class ParserHH(Parser):
             'date_to': time_to.isoformat(),
             'per_page': 100,
             'page': page,  # количество результатов на странице
-            'area': 1  # id города
         }
-        async with self.sem:
-            try:
-                async with self.session.get(self.url, params=params) as response:
-                    return await response.json()
-            except (aiohttp.ServerDisconnectedError,
-                    aiohttp.ContentTypeError,
-                    asyncio.TimeoutError,
-                    aiohttp.ClientPayloadError,
-                    aiohttp.ClientOSError,
-                    aiohttp.ClientConnectorError,
-                    ConnectionAbortedError) as err:
-                self.logger.error(f'Not parsed {err}')
+        if self.region is not None:
+            params[self.region_param] = self.region  # id региона (см. settings.REGIONS)
+        return await self.fetch(self.url, params=params)
 
     async def get_number_pages(self, time_from, time_to):
         """
@@ -64,65 +59,52 @@ class ParserHH(Parser):
         отрезок времени, в котором будет происходить поиск вакансий.
 
         Назначение:
-        сделать запрос, получить количество страниц и создать новые таски.
+        сделать запрос первой страницы и получить количество вакансий в отрезке времени.
 
-        Делает запрос с отрезком времени, если ответ не пустой,
-        высчитывает количество страниц с вакансиями.
+        Возвращает:
+        кортеж из количества найденных вакансий и первой страницы ответа
+        либо None, если ответ пустой.
         """
         resp = await self.get_response(time_from, time_to)
         if resp:
             try:
-                if resp['found'] >= 2000:
-                    self.logger.error(
-                        f'More than 2000 vacancies from{time_from} to{time_to}, {resp["found"]}'
-                    )
-            except Exception as e:
-                self.logger.error(e, resp)
-            total_pages = resp['found'] // 100
-            if total_pages == 0:
-                total_pages = 1
-            await asyncio.create_task(self.get_vacancies(time_from, time_to, total_pages))
-
-    async def get_vacancies(self, time_from, time_to, total_pages):
+                return resp['found'], resp
+            except KeyError:
+                self.logger.error('Unexpected response from %s to %s: %s', time_from, time_to, resp)
+
+    async def save_vacancies(self, resp):
+        """
+        Передает вакансии страницы ответа API на разбор и запись (см. Parser.write_page).
+        """
+        await self.write_page(resp['items'])
+
+    def extract(self, vacancy):
         """
         Принимает:
-        время, с которого начинается поиск вакансий,
-        время, по которое происходит поиск вакансий,
-        общее количество страниц с вакансиями.
+        вакансию из ответа API.
 
         Назначение:
-        сделать запрос, обработать результат запроса и записать в базу данных
-
-        Сначала генерируются номера страниц от 0 до последней страницы (total_pages),
-        затем происходит новый запрос с отрезком времени и номером страницы.
-        В случае, если ответ не пустой, получаем следующие данные из ответа:
-        id вакансии,
-        размер заработной платы (от, до и валюту зарплаты),
-        url данной вакансии,
-        краткое описание вакансии,
-        наименование компании, разместившей вакансию,
-        наименование вакансии,
-        формат работы (удаленка),
-        город, где предполагается работа,
-        дата размещения вакансии.
-        Следом происходит запись полученной информации в базу данных.
+        получить id вакансии, размер заработной платы (от, до и валюту зарплаты),
+        url, краткое описание, наименование компании, наименование вакансии,
+        формат работы, город и дату размещения вакансии.
+
+        Возвращает:
+        Vacancy.
         """
-        for page in range(total_pages):
-            resp = await self.get_response(time_from, time_to, page)
-            if resp:
-                for vacancy in resp['items']:
-                    vacancy_id = self.get_vacancy_id(vacancy)  # id вакансии
-                    salary_from, salary_to, curr = self.get_salary(vacancy['salary'])  # предлагаемая зарплата
-                    url = self.get_vacancy_url(vacancy)  # url вакансии
-                    description = self.get_description(vacancy)  # описание вакансии
-                    company = self.get_company_name(vacancy)  # наименование компании, разместившей вакансию
-                    title = self.get_title(vacancy)  # наименование вакансии
-                    job_format = self.get_vacancy_format(vacancy)  # формат работы (удаленно, в офисе)
-                    areas = self.get_city_vacancy(vacancy)  # город, в котором размещена вакансия
-                    date_posted = self.get_date_vacancy(vacancy)  # дата размещения вакансии
-                    # запись всей полученной информации в базу данных
-                    self.db.write_to_database(vacancy_id, salary_from, salary_to, curr, areas, url, description,
-                                              company, title, job_format, date_posted)
+        salary_from, salary_to, curr = self.get_salary(vacancy['salary'])
+        return Vacancy(
+            vacancy_id=self.get_vacancy_id(vacancy),
+            salary_from=salary_from,
+            salary_to=salary_to,
+            curr=curr,
+            areas=self.get_city_vacancy(vacancy),
+            url=self.get_vacancy_url(vacancy),
+            description=self.get_description(vacancy),
+            company=self.get_company_name(vacancy),
+            title=self.get_title(vacancy),
+            format=self.get_vacancy_format(vacancy),
+            date=self.get_date_vacancy(vacancy),
+        )
 
     def get_vacancy_id(self, vacancy):
         return vacancy['id']
@@ -181,21 +163,19 @@ class ParserHH(Parser):
     def get_city_vacancy(self, vacancy):
         return vacancy['area']['name']
 
-    async def start_parse(self):
-        tasks = []
-        async with aiohttp.ClientSession() as self.session:
-            while self.time_end < self.time_from:
-                tasks.append(asyncio.create_task(self.get_number_pages(self.time_from, self.time_to)))
-                self.time_from -= timedelta(minutes=self.search_interval)
-                self.time_to -= timedelta(minutes=self.search_interval)
-            await asyncio.gather(*tasks)
+    async def parse(self):
+        await self.parse_windows()
 
 
-@duration
 def get_parse_hh():
+    # оркестратор наполняет и сохраняет общий фильтр seen регионов один раз;
+    # импорт внутри функции - orchestrator сам импортирует этот модуль
+    from vacancy_parser.orchestrator import Orchestrator
+
     loop = asyncio.get_event_loop()
-    hh = ParserHH(days=1).start_parse()
-    loop.run_until_complete(hh)
+    summary = loop.run_until_complete(Orchestrator([ParserHH.source]).run(days=1))
+    for report in summary['sources']:
+        print(report)
 
 
 if __name__ == '__main__':
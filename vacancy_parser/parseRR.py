@@ -1,24 +1,35 @@
 import asyncio
-import aiohttp
+import os
 
-from lxml import etree
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import current_process
 
-from vacancy_parser.base_parser import duration, Parser
+import settings
+from vacancy_parser import rr_pages
+from vacancy_parser.base_parser import Parser
+from vacancy_parser.pipeline import Pipeline
 
 
 class ParserRR(Parser):
     """
     Класс для парсинга вакансий с сайта https://www.rabota.ru.
 
-    Реализован в асинхронном режиме.
+    Реализован в асинхронном режиме: цикл событий только выполняет запросы,
+    а разбор HTML происходит в пуле процессов (см. vacancy_parser.rr_pages).
+    Запросы и разбор страниц - этапы конвейера с ограниченными очередями (см. get_number_pages).
 
     start_url - стартовая страница для начала парсинга.
-    Установлено ограничение на количество подключений, из-за ограничений сервиса.
+    Установлено ограничение на количество подключений и частоту запросов (см. RateLimiter),
+    из-за ограничений сервиса.
     """
 
+    source = 'rr'
     start_url = 'https://www.rabota.ru/'
-    sem = asyncio.Semaphore(24)  # ограничение количества одновременных подключений.
+    host = 'www.rabota.ru'
+    city = None  # город, для которого rabota.ru показывает вакансии, определяется по первой странице
+    parse_workers = settings.RR_PARSE_WORKERS  # количество процессов для разбора страниц
+    seen_warm_days = 30  # rabota.ru не ищет по дате, в выдаче вакансии примерно за месяц
+    date_search = False  # выдача rabota.ru не фильтруется по дате, поэтому обходится целиком
 
     async def get_response(self, page):
         """
@@ -28,55 +39,88 @@ class ParserRR(Parser):
         Назначение:
         сделать запрос по url и вернуть результат запроса.
 
-        Выполняется запрос по указанному url (self.start_url),
-        обработка происходит через библиотеку lxml.
-        Обрабатываются ошибки и записываются в файл логгирования.
+        Выполняется запрос по указанному url (self.start_url)
+        с повторами при ошибках (см. Parser.fetch).
 
         Возвращает:
-        DOM-дерево.
+        html-текст страницы.
         """
         params = {'page': page}
+        return await self.fetch(self.start_url, params=params, text=True)  # создаем запрос
+
+    async def parse_page(self, text, page):
+        """
+        Принимает:
+        html-текст страницы,
+        номер страницы.
+
+        Назначение:
+        разобрать страницу в пуле процессов (см. rr_pages.parse_page),
+        не занимая цикл событий разбором HTML.
+
+        Возвращает:
+        количество страниц (для первой страницы) и список Vacancy
+        либо None, если страницу не удалось разобрать.
+        """
+        loop = asyncio.get_running_loop()
         try:
-            async with self.sem:
-                async with self.session.get(self.start_url, params=params) as response:  # создаем запрос
-                    text = await response.text()  # читает полученный результат
-                    parser = etree.HTML(text)  # парсит в вид HTML
-                    if page == 1:
-                        self.city = parser.find('.//svg[@class="icon md-icon md-r-location"]').getnext().text
-                    return parser
-        except (aiohttp.ServerDisconnectedError,
-                aiohttp.ContentTypeError,
-                asyncio.TimeoutError,
-                aiohttp.ClientPayloadError,
-                aiohttp.ClientOSError,
-                aiohttp.ClientConnectorError,
-                ConnectionAbortedError) as e:
-            self.logger.error(e)
+            with self.metrics.timer('parse_seconds'):
+                city, number_pages, records, errors = await loop.run_in_executor(
+                    self.pool, rr_pages.parse_page, text, page, self.city
+                )
         except Exception as e:
             self.logger.error("uncaught exception: %s", e)
+            return
+        if errors:
+            self.logger.error('Not parsed %s vacancies on page %s', errors, page)
+        if page == 1:
+            self.city = city
+        return number_pages, records
 
     async def get_number_pages(self):
         """
         Назначение:
         Получить общее количество страниц с вакансиями.
 
-        Делает запрос страницы 1 для получения DOM-дерева.
-        По заданному тегу находит количество страниц.
-        Итерируется, генерируя и созадвая новый таск
-        с номером страницы добавляя в список.
-        Запускаем одновременно все таски функцией gather()
+        Делает запрос страницы 1, записывает ее вакансии
+        и по блоку пагинации находит количество страниц.
+        Затем страницы со 2 до последней проходят конвейер:
+        pages - запросы (столько обработчиков, сколько допускает ограничитель подключений),
+        parse - разбор в пуле процессов (parse_workers обработчиков) и запись.
+        Страница запрашивается, только когда для нее есть место в parse, поэтому в памяти
+        не больше queue_size html-страниц при любом количестве страниц,
+        а медленный разбор или запись приостанавливают запросы.
         """
-        parser = await self.get_response(page=1)
-        # Если возвращается пустой результат, то пропускает данную страницу.
-        if parser is None:
+        text = await self.get_response(page=1)
+        parsed = await self.parse_page(text, 1) if text is not None else None
+        # Если возвращается пустой результат, то без первой страницы количество страниц неизвестно.
+        if parsed is None:
+            self.mark_failed(page=1)
             return
-        test = []
-        # По имени класса находит номера страниц, выбирает из списка последний элемент - номер последний страницы.
-        number_pages = [par.text.strip() for par in parser.findall('.//li//a[@class="pagination-list__item"]')][-1]
-        # Итерирация со 2 страницы до последней, создавая новый таск.
-        for page in range(2, int(number_pages) + 1):
-            test.append(asyncio.create_task(self.get_data(page=page)))
-        await asyncio.gather(*test)  # запускает все таски
+        number_pages, records = parsed
+        await self.write_vacancies(records)
+
+        async def fetch_text(page):
+            text = await self.get_response(page)
+            return (text, page) if text is not None else None
+
+        async def fetch_page(page):
+            # страница запрашивается, когда для нее есть место в очереди разбора
+            if await parse.put_from(fetch_text(page)) is None:
+                self.mark_failed(page=page)
+                self.logger.error('Not parsing %s', page)
+
+        async def parse_page(item):
+            text, page = item
+            await self.save_page(await self.parse_page(text, page), page)
+
+        pipeline = Pipeline(self.logger)
+        pipeline.stage('pages', fetch_page, self.concurrency.maximum, self.queue_size)
+        parse = pipeline.stage('parse', parse_page, self.parse_workers or os.cpu_count(), self.queue_size)
+        try:
+            await pipeline.run(range(2, number_pages + 1))
+        finally:
+            self.track_pipeline(pipeline)
 
     async def get_data(self, page):
         """
@@ -86,9 +130,7 @@ class ParserRR(Parser):
         Назначение:
         выполнить запрос и получить информацию о вакансиях.
 
-        Выполняет запрос и получает данные для дальнейшей работы с DOM-деревом.
-        Если результат не пустой, происходит итерация по результатам запроса.
-        Со страницы получаем:
+        Страница разбирается в пуле процессов, со страницы получаем:
         id вакансии,
         размер заработной платы (от, до и валюту зарплаты),
         url данной вакансии,
@@ -99,101 +141,59 @@ class ParserRR(Parser):
         город, где предполагается работа,
         дата размещения вакансии.
 
-        Далее происходит запись полученной информации в базу данных.
+        Далее вакансии страницы передаются фоновому писателю одним пакетом.
         """
-        parser = await self.get_response(page)  # Создается запрос страницы
-        if parser is not None:
-            vacancies = parser.findall('.//div[@class="vacancy-preview-card__top"]')
-            for vacancy in vacancies:
-                vacancy_id = self.get_vacancy_id(vacancy)
-                salary_from, salary_to, curr = \
-                    self.get_salary(vacancy.find('.//div[@class="vacancy-preview-card'
-                                                 '__salary vacancy-preview-card__salary-blue"]//a//span').text)
-                vacancy_url = self.get_vacancy_url(vacancy)
-                description = self.get_description(vacancy)
-                company = self.get_company_name(vacancy)
-                title = self.get_title(vacancy)
-                job_format = self.get_vacancy_format(vacancy)
-                areas = self.city
-                date_posted = self.get_date_vacancy(vacancy)
-                self.db.write_to_database(vacancy_id, salary_from, salary_to, curr, areas, vacancy_url,
-                                          description,
-                                          company, title, job_format, date_posted)
-        else:
-            self.logger.error(f'Not parsing {page}')
-
-    def get_vacancy_id(self, vacancy):
-        parent = vacancy.getparent()
-        return int(parent.attrib['data-key'].split(':')[0])
-
-    def get_salary(self, vacancy):
-        if 'договорная зарплата' in vacancy:
-            return 0, 0, 'RUB'
-        salary = vacancy.replace('\xa0', ' ')
-        salary_split = salary.split('—')
-        if len(salary_split) == 2:
-            salary_from = int(salary_split[0].replace(' ', ''))
-            salary_split = salary_split[1].split()
-            salary_to = int(salary_split[0] + salary_split[1])
-        else:
-            if 'от' in str(salary):
-                salary = salary.replace('руб.', '').split('от')
-                salary_from = int(salary[1].replace(' ', ''))
-                salary_to = 0
-            elif 'до' in str(salary):
-                salary = salary.replace('руб.', '').split('до')
-                salary_to = int(salary[1].replace(' ', ''))
-                salary_from = 0
-            else:
-                salary_to = salary.replace('руб.', '').replace(' ', '')
-                salary_from = 0
-        curr = 'RUB'
-        return salary_from, salary_to, curr
-
-    def get_vacancy_url(self, vacancy):
-        url = 'https://www.rabota.ru'
-        vacancy_url = url + vacancy.find('.//h3[@class="vacancy-preview-card__title"]//a').attrib['href']
-        return vacancy_url
-
-    def get_description(self, vacancy):
-        try:
-            return vacancy.find('.//div[@class="vacancy-preview-card__short-description"]').text
-        except AttributeError:
-            return None
+        text = await self.get_response(page)  # Создается запрос страницы
+        parsed = await self.parse_page(text, page) if text is not None else None
+        await self.save_page(parsed, page)
 
-    def get_company_name(self, vacancy):
-        try:
-            return vacancy.find('.//span[@class="vacancy-preview-card__company-name"]//a').text
-        except AttributeError:
-            return None
-
-    def get_title(self, vacancy):
-        return vacancy.find('.//h3[@class="vacancy-preview-card__title"]//a').text
-
-    def get_vacancy_format(self, vacancy):
-        return None
-
-    def get_city_vacancy(self, vacancy):
-        return vacancy.find('.//svg[@class="icon md-icon md-r-location"]').getnext().text
+    async def save_page(self, parsed, page):
+        """
+        Принимает:
+        результат parse_page (None, если страницу не удалось получить или разобрать),
+        номер страницы.
 
-    def get_date_vacancy(self, vacancy):
-        vacancy_date = vacancy.find('.//meta[@itemprop="datePosted"]').attrib['content']
-        date_strip = vacancy_date.split('.')
-        format_date = datetime.strptime(date_strip[0], '%Y-%m-%dT%H:%M:%S')
-        return format_date
+        Назначение:
+        передать вакансии страницы фоновому писателю одним пакетом
+        либо запомнить страницу, которую не удалось получить.
+        """
+        if parsed is not None:
+            await self.write_vacancies(parsed[1])
+        else:
+            self.mark_failed(page=page)
+            self.logger.error('Not parsing %s', page)
 
-    async def start_parse(self):
-        tasks = []
-        async with aiohttp.ClientSession() as self.session:
-            tasks.append(asyncio.create_task(self.get_number_pages()))
-            await asyncio.gather(*tasks)
+    def extract(self, card):
+        """
+        Извлекает Vacancy из карточки вакансии html-страницы.
+        При обходе карточки разбираются в пуле процессов функцией rr_pages.extract.
+        """
+        return rr_pages.extract(card, self.city)
+
+    async def run(self, crawl):
+        # пул процессов для разбора страниц живет столько же, сколько сессия.
+        # Процессы-воркеры Celery (prefork) не могут порождать дочерние процессы,
+        # поэтому в них страницы разбираются в пуле потоков.
+        executor = ThreadPoolExecutor if current_process().daemon else ProcessPoolExecutor
+        with executor(self.parse_workers) as self.pool:
+            await super().run(crawl)
+
+    async def parse(self):
+        await self.get_number_pages()
+
+    async def refetch(self, time_from, time_to, page):
+        # без первой страницы не было известно количество страниц, поэтому обход повторяется целиком
+        if page == 1:
+            await self.get_number_pages()
+        else:
+            await self.get_data(page)
 
 
-@duration
 def get_parse_rr():
     loop = asyncio.get_event_loop()
-    parser = ParserRR().start_parse()
-    loop.run_until_complete(parser)
+    parser = ParserRR()
+    loop.run_until_complete(parser.start_parse())
+    print(parser.report())
 
 
 if __name__ == '__main__':
@@ -1,28 +1,33 @@
 import asyncio
-import aiohttp
 
-from random import uniform
-from datetime import datetime, timedelta
+from datetime import datetime
 
 import config
-from vacancy_parser.base_parser import Parser, duration
+from vacancy_parser.base_parser import Parser
+from vacancy_parser.vacancy import Vacancy
 
 
 class ParserSJ(Parser):
     """
     Класс для работы с API https://www.superjob.ru/
 
+    Вакансии ищутся в одном регионе (параметр town, см. settings.REGIONS).
+
     Из-за ограничения количества получаемых результатов в 500,
-    запросы отправляются с отрезком размещения вакансий 15 минут,
-    что позволяет получить меньше максимального ограничения вакансий в ответе.
+    период поиска разбивается на окна по времени размещения вакансий (см. WindowPlanner),
+    в каждом из которых вакансий меньше максимального ограничения.
 
-    Так же устанавливается ограничение на количество одновременных подключений.
+    Так же устанавливается ограничение на количество одновременных подключений,
+    а частота запросов ограничивается лимитом API (см. RateLimiter).
     """
 
     __SECRET_KEY = config.SJ_KEY
+    source = 'sj'
     url = 'https://api.superjob.ru/2.0/vacancies/'
-    sem = asyncio.Semaphore(100)
+    host = 'api.superjob.ru'
     search_interval = 15  # интервал поиска, в минутах
+    search_cap = 500
+    region_param = 'town'
 
     async def get_response(self, time_from=None, time_to=None, page=0):
         """
@@ -38,30 +43,19 @@ class ParserSJ(Parser):
         ответ в формате json
 
         Сначала формируются параметры, с которыми происходит запрос,
-        в асинхронном режиме делает запрос, возвращает ответ.
-        Обрабатывает ошибки, записывая их в файл логгирования.
+        в асинхронном режиме делает запрос (с повторами при ошибках, см. Parser.fetch),
+        возвращает ответ.
         """
         params = {
             'date_published_from': time_from.timestamp(),
             'date_published_to': time_to.timestamp(),
             'count': 100,
             'page': page,  # количество результатов на странице
-            'town': 4  # id города
         }
+        if self.region is not None:
+            params[self.region_param] = self.region  # id региона (см. settings.REGIONS)
         headers = {'X-Api-App-Id': self.__SECRET_KEY}
-        async with self.sem:
-            await asyncio.sleep(uniform(10, 25))
-            try:
-                async with self.session.get(self.url, params=params, headers=headers) as response:
-                    return await response.json()
-            except (aiohttp.ServerDisconnectedError,
-                    aiohttp.ContentTypeError,
-                    asyncio.TimeoutError,
-                    aiohttp.ClientPayloadError,
-                    aiohttp.ClientOSError,
-                    aiohttp.ClientConnectorError
-                    ) as err:
-                self.logger.error(f'Not parsed {err}')
+        return await self.fetch(self.url, params=params, headers=headers)
 
     async def get_number_pages(self, time_from, time_to):
         """
@@ -70,62 +64,56 @@ class ParserSJ(Parser):
         время, по которое происходит поиск.
 
         Назначение:
-        сделать запрос с отрезком времени поиска,
-        если ответ не пустой, получает количество страниц
-        с вакансиями в данном промежутке времени.
-        Создает новый таск для нового запроса с отрезком времени
-        и количеством страниц.
+        сделать запрос первой страницы с отрезком времени поиска и получить
+        количество вакансий в данном промежутке времени.
+
+        Возвращает:
+        кортеж из количества найденных вакансий и первой страницы ответа
+        либо None, если ответ пустой.
         """
         resp = await self.get_response(time_from, time_to)
-        if resp:
-            number_pages = resp['total'] // 100
-            if number_pages == 0:
-                number_pages = 1
-            await asyncio.create_task(self.get_vacancies(time_from, time_to, number_pages))
-        else:
-            self.logger.error(f'Not found from {time_from} to {time_to}')
-
-    async def get_vacancies(self, time_from, time_to, number_pages):
+        if not resp:
+            self.logger.error('Not found from %s to %s', time_from, time_to)
+            return
+        total = resp.get('total')
+        if total is None:
+            self.logger.error('Unexpected response from %s to %s: %s', time_from, time_to, resp)
+            return
+        return total, resp
+
+    async def save_vacancies(self, resp):
+        """
+        Передает вакансии страницы ответа API на разбор и запись (см. Parser.write_page).
+        """
+        await self.write_page(resp['objects'])
+
+    def extract(self, vacancy):
         """
         Принимает:
-        время, с которого начинается поиск,
-        время по которое происходит поиск,
-        общее количество страниц с вакансиями в данный промежуток времени.
+        вакансию из ответа API.
 
         Назначение:
-        сделать запрос, обработать полученную информацию и записать в базу данных.
-
-        Сначала генерируются номера страниц от 0 до number_pages,
-        затем происходит запрос с промежутком времени и номером страницы.
-        Если ответ не пустой, обрабатываем информацию, получая со страницы:
-        id вакансии,
-        размер заработной платы (от, до и валюту зарплаты),
-        url данной вакансии,
-        краткое описание вакансии,
-        наименование компании, разместившей вакансию,
-        наименование вакансии,
-        формат работы (удаленка),
-        город, где предполагается работа,
-        дата размещения вакансии.
-        Следом происходит запись полученной информации в базу данных.
+        получить id вакансии, размер заработной платы (от, до и валюту зарплаты),
+        url, краткое описание, наименование компании, наименование вакансии,
+        формат работы, город и дату размещения вакансии.
+
+        Возвращает:
+        Vacancy.
         """
-        for page in range(number_pages):
-            resp = await self.get_response(time_from, time_to, page)
-            if resp:
-                for vacancy in resp['objects']:
-                    vacancy_id = self.get_vacancy_id(vacancy)
-                    salary_from, salary_to, curr = self.get_salary(vacancy)
-                    url = self.get_vacancy_url(vacancy)
-                    description = self.get_description(vacancy)
-                    company = self.get_company_name(vacancy)
-                    title = self.get_title(vacancy)
-                    job_format = self.get_vacancy_format(vacancy)
-                    areas = self.get_city_vacancy(vacancy)
-                    date_published = self.get_date_vacancy(vacancy)
-                    self.db.write_to_database(vacancy_id, salary_from, salary_to, curr, areas, url, description,
-                                              company, title, job_format, date_published)
-            else:
-                self.logger.error(f'Not Found from {time_from} to {time_to}, page {page}')
+        salary_from, salary_to, curr = self.get_salary(vacancy)
+        return Vacancy(
+            vacancy_id=self.get_vacancy_id(vacancy),
+            salary_from=salary_from,
+            salary_to=salary_to,
+            curr=curr,
+            areas=self.get_city_vacancy(vacancy),
+            url=self.get_vacancy_url(vacancy),
+            description=self.get_description(vacancy),
+            company=self.get_company_name(vacancy),
+            title=self.get_title(vacancy),
+            format=self.get_vacancy_format(vacancy),
+            date=self.get_date_vacancy(vacancy),
+        )
 
     def get_vacancy_id(self, vacancy):
         return vacancy['id']
@@ -157,21 +145,19 @@ class ParserSJ(Parser):
     def get_date_vacancy(self, vacancy):
         return datetime.fromtimestamp(vacancy['date_published'])
 
-    async def start_parse(self):
-        tasks = []
-        async with aiohttp.ClientSession() as self.session:
-            while self.time_end < self.time_from:
-                tasks.append(asyncio.create_task(self.get_number_pages(self.time_from, self.time_to)))
-                self.time_from -= timedelta(minutes=self.search_interval)
-                self.time_to -= timedelta(minutes=self.search_interval)
-            await asyncio.gather(*tasks)
+    async def parse(self):
+        await self.parse_windows()
 
 
-@duration
 def get_parse_sj():
+    # оркестратор наполняет и сохраняет общий фильтр seen регионов один раз;
+    # импорт внутри функции - orchestrator сам импортирует этот модуль
+    from vacancy_parser.orchestrator import Orchestrator
+
     loop = asyncio.get_event_loop()
-    hh = ParserSJ(days=1).start_parse()
-    loop.run_until_complete(hh)
+    summary = loop.run_until_complete(Orchestrator([ParserSJ.source]).run(days=1))
+    for report in summary['sources']:
+        print(report)
 
 
 if __name__ == '__main__':
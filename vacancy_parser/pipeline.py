@@ -0,0 +1,139 @@
+import asyncio
+
+
+class Stage:
+    """
+    Этап конвейера: очередь заданий и несколько обработчиков, которые берут из нее задания.
+
+    Принимает:
+    наименование этапа,
+    корутинную функцию обработки одного задания,
+    количество обработчиков,
+    наибольшее количество заданий этапа (0 - без ограничения).
+
+    Задание занимает место с постановки в очередь до конца обработки. Если мест нет,
+    put ждет, пока обработчики освободят место, поэтому медленный этап приостанавливает
+    предыдущие, а не копит задания в памяти.
+    """
+
+    def __init__(self, name, handler, workers, maxsize):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(maxsize) if maxsize else None  # свободные места для заданий
+        self.processed = 0  # количество обработанных заданий
+        self.max_queued = 0  # наибольшая длина очереди
+
+    async def put(self, item):
+        if self.slots is not None:
+            await self.slots.acquire()
+        self.enqueue(item)
+
+    async def put_from(self, produce):
+        """
+        Принимает:
+        корутину, которая возвращает задание либо None.
+
+        Назначение:
+        занять место в этапе до того, как задание будет получено.
+        Так ответ сервера запрашивается, только когда для него есть место,
+        и не ждет места в памяти обработчика предыдущего этапа.
+        """
+        if self.slots is not None:
+            await self.slots.acquire()
+        try:
+            item = await produce
+        except BaseException:
+            self.release()
+            raise
+        if item is None:
+            self.release()
+        else:
+            self.enqueue(item)
+        return item
+
+    def enqueue(self, item):
+        self.queue.put_nowait(item)
+        self.max_queued = max(self.max_queued, self.queue.qsize())
+
+    def release(self):
+        if self.slots is not None:
+            self.slots.release()
+
+    def stats(self):
+        return {'workers': self.workers, 'processed': self.processed, 'max_queued': self.max_queued}
+
+
+class Pipeline:
+    """
+    Конвейер из последовательных этапов (Stage), связанных очередями asyncio.Queue
+    с ограниченным количеством заданий.
+
+    Принимает:
+    логгер.
+
+    Назначение:
+    обрабатывать задания потоком (например, окна поиска -> страницы -> разбор и запись)
+    фиксированным количеством обработчиков вместо задачи на каждое окно и страницу.
+    Одновременно в памяти находится не больше заданий, чем помещается в очереди этапов
+    и обрабатывается их обработчиками, независимо от длины периода и количества страниц.
+
+    Обработчик этапа передает задания следующим этапам через их методы put и put_from.
+    Конвейер завершается, когда задания из источника и все порожденные ими задания обработаны.
+    Ошибка обработчика записывается в лог, остальные задания продолжают обрабатываться,
+    а после завершения конвейера первая ошибка выбрасывается из run.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.stages = []
+        self.error = None  # первая ошибка обработчиков
+
+    def stage(self, name, handler, workers, maxsize):
+        """
+        Добавляет этап в конец конвейера и возвращает его.
+        """
+        stage = Stage(name, handler, max(workers, 1), maxsize)
+        self.stages.append(stage)
+        return stage
+
+    async def work(self, stage):
+        while True:
+            item = await stage.queue.get()
+            try:
+                await stage.handler(item)
+            except Exception as e:
+                if self.error is None:
+                    self.error = e
+                if self.logger:
+                    self.logger.error('Stage %s failed: %r', stage.name, e)
+            finally:
+                stage.processed += 1
+                stage.release()
+                stage.queue.task_done()
+
+    async def run(self, items):
+        """
+        Принимает:
+        итерируемый источник заданий первого этапа.
+
+        Назначение:
+        обработать все задания. Источник читается по мере освобождения места в очереди первого этапа.
+        """
+        workers = [asyncio.create_task(self.work(stage)) for stage in self.stages for _ in range(stage.workers)]
+        try:
+            for item in items:
+                await self.stages[0].put(item)
+            # этап завершен, когда его очередь пуста, а предыдущие этапы уже не могут добавить в нее задания
+            for stage in self.stages:
+                await stage.queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        if self.error is not None:
+            raise self.error
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
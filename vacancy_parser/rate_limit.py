@@ -0,0 +1,106 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import settings
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов к одному хосту (алгоритм token bucket).
+
+    Принимает:
+    допустимое количество запросов в секунду,
+    размер пачки - сколько запросов можно сделать подряд без ожидания,
+    паузу по умолчанию (в секундах) после ответа 429 без заголовка Retry-After.
+
+    Назначение:
+    ограничить пропускную способность реальным лимитом API вместо случайных пауз.
+    Корутина, не получившая токен, резервирует следующий и ждет ровно до его появления,
+    поэтому ожидающие запросы распределяются равномерно.
+    Если сервер ответил 429 (или 503 с заголовком Retry-After), запросы к хосту
+    приостанавливаются на время из заголовка Retry-After либо на penalty секунд.
+
+    Экземпляры не привязаны к циклу событий и общие для всех парсеров процесса
+    (см. for_host), поэтому лимит хоста соблюдается при одновременной работе нескольких парсеров.
+    """
+    limited_statuses = (429, 503)
+    limiters = {}
+
+    def __init__(self, rate, burst, penalty=10):
+        self.rate = rate
+        self.burst = burst
+        self.penalty = penalty
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+    @classmethod
+    def for_host(cls, host):
+        """
+        Возвращает общий ограничитель для хоста с настройками из settings.RATE_LIMITS.
+        """
+        if host not in cls.limiters:
+            rate, burst = settings.RATE_LIMITS.get(host, settings.DEFAULT_RATE_LIMIT)
+            cls.limiters[host] = cls(rate, burst)
+        return cls.limiters[host]
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """
+        Дожидается разрешения на очередной запрос.
+        """
+        now = time.monotonic()
+        self.refill(now)
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+        while True:
+            delay = self.blocked_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    def update(self, response):
+        """
+        Принимает:
+        ответ сервера.
+
+        Назначение:
+        приостановить запросы к хосту, если сервер сообщил о превышении лимита.
+
+        Возвращает:
+        True, если запрос был отклонен из-за превышения лимита.
+        Ответ 503 без Retry-After считается обычной ошибкой сервера.
+        """
+        if response.status not in self.limited_statuses:
+            return False
+        retry_after = response.headers.get('Retry-After')
+        if response.status == 503 and not retry_after:
+            return False  # обычный сбой сервера, а не превышение лимита
+        now = time.monotonic()
+        delay = self.retry_after(retry_after)
+        self.blocked_until = max(self.blocked_until, now + delay)
+        self.refill(now)
+        self.tokens = min(self.tokens, 0)
+        return True
+
+    def retry_after(self, value):
+        """
+        Разбирает заголовок Retry-After: количество секунд либо дату.
+        """
+        if not value:
+            return self.penalty
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return self.penalty
+        return max((date - datetime.now(timezone.utc)).total_seconds(), 0)
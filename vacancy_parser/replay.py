@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import json
+import os
+from random import random, uniform
+
+from multidict import CIMultiDict
+
+
+class Cassette:
+    """
+    Каталог с записанными ответами источника.
+
+    Принимает:
+    путь к каталогу.
+
+    Назначение:
+    сохранять ответы get_response на диск (режим записи)
+    и отдавать их при воспроизведении (см. ReplaySession).
+
+    Каждый ответ хранится в отдельном файле, имя которого - хеш url и параметров запроса.
+    В meta.json записывается период поиска, чтобы при воспроизведении
+    парсер построил те же окна и запросы, что и при записи.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(url, params):
+        data = json.dumps([url, params or {}], sort_keys=True, default=str)
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    def record(self, url, params, status, body):
+        with open(os.path.join(self.path, f'{self.key(url, params)}.json'), 'w', encoding='utf-8') as file:
+            json.dump({'url': url, 'params': params, 'status': status, 'body': body},
+                      file, ensure_ascii=False, default=str)
+
+    def load(self, url, params):
+        try:
+            with open(os.path.join(self.path, f'{self.key(url, params)}.json'), encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def write_meta(self, **meta):
+        with open(os.path.join(self.path, 'meta.json'), 'w', encoding='utf-8') as file:
+            json.dump(meta, file, default=str)
+
+    def read_meta(self):
+        with open(os.path.join(self.path, 'meta.json'), encoding='utf-8') as file:
+            return json.load(file)
+
+
+class ReplayResponse:
+    """
+    Ответ из кассеты с тем же интерфейсом, что и у ответа aiohttp.
+    """
+
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = CIMultiDict(headers or {})
+
+    async def text(self):
+        return self.body
+
+    async def read(self):
+        return self.body.encode()
+
+    def get_encoding(self):
+        return 'utf-8'
+
+    async def json(self):
+        return json.loads(self.body)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class ReplaySession:
+    """
+    Замена aiohttp.ClientSession, которая отдает ответы из кассеты.
+
+    Принимает:
+    кассету,
+    задержку ответа в секундах и ее случайный разброс,
+    долю запросов, на которые отвечать ошибкой 503,
+    долю запросов, на которые отвечать 429 с заголовком Retry-After.
+
+    Назначение:
+    воспроизводить работу парсеров без обращения к сайтам,
+    с управляемой задержкой и внедрением ошибок.
+    Запрос, которого нет в кассете, получает ответ 404.
+    """
+
+    def __init__(self, cassette, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0):
+        self.cassette = cassette
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.requests = 0
+        self.bytes = 0
+
+    def get(self, url, params=None, headers=None):
+        return _ReplayRequest(self, url, params)
+
+    async def respond(self, url, params):
+        self.requests += 1
+        delay = self.latency + uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        chance = random()
+        if chance < self.error_rate:
+            return ReplayResponse(503, '')
+        if chance < self.error_rate + self.throttle_rate:
+            return ReplayResponse(429, '', {'Retry-After': '1'})
+        recorded = self.cassette.load(url, params)
+        if recorded is None:
+            return ReplayResponse(404, '')
+        self.bytes += len(recorded['body'])
+        return ReplayResponse(recorded['status'], recorded['body'])
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _ReplayRequest:
+    def __init__(self, session, url, params):
+        self.session = session
+        self.url = url
+        self.params = params
+
+    async def __aenter__(self):
+        return await self.session.respond(self.url, self.params)
+
+    async def __aexit__(self, *exc):
+        return False
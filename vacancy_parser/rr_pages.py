@@ -0,0 +1,143 @@
+"""
+Разбор страниц rabota.ru.
+
+Функции модуля выполняются в процессах-воркерах (см. ParserRR.parse_page),
+поэтому принимают и возвращают только простые значения: текст страницы на входе,
+кортежи с информацией о вакансиях на выходе. XPath-выражения компилируются
+один раз при импорте модуля в каждом процессе.
+"""
+from datetime import datetime
+
+from lxml import etree
+
+from vacancy_parser.vacancy import Vacancy
+
+
+SITE_URL = 'https://www.rabota.ru'
+
+CARDS = etree.XPath('.//div[@class="vacancy-preview-card__top"]')
+PAGINATION = etree.XPath('.//li//a[@class="pagination-list__item"]')
+LOCATION = etree.XPath('.//svg[@class="icon md-icon md-r-location"]')
+SALARY = etree.XPath('.//div[@class="vacancy-preview-card__salary vacancy-preview-card__salary-blue"]//a//span')
+TITLE = etree.XPath('.//h3[@class="vacancy-preview-card__title"]//a')
+DESCRIPTION = etree.XPath('.//div[@class="vacancy-preview-card__short-description"]')
+COMPANY = etree.XPath('.//span[@class="vacancy-preview-card__company-name"]//a')
+DATE_POSTED = etree.XPath('.//meta[@itemprop="datePosted"]')
+
+
+def first(xpath, element):
+    found = xpath(element)
+    return found[0] if found else None
+
+
+def parse_page(text, page, city=None):
+    """
+    Принимает:
+    html-текст страницы,
+    номер страницы,
+    город, определенный по первой странице.
+
+    Назначение:
+    получить со страницы информацию о вакансиях.
+    На первой странице также определяются город и количество страниц.
+
+    Возвращает:
+    кортеж из города, количества страниц (None, если страница не первая),
+    списка Vacancy и количества карточек, которые не удалось разобрать.
+    """
+    tree = etree.HTML(text)
+    number_pages = None
+    if page == 1:
+        city = get_city(tree)
+        pages = [item.text.strip() for item in PAGINATION(tree)]
+        number_pages = int(pages[-1]) if pages else 1
+    records, errors = [], 0
+    for card in CARDS(tree):
+        try:
+            records.append(extract(card, city))
+        except (AttributeError, IndexError, KeyError, ValueError):
+            errors += 1
+    return city, number_pages, records, errors
+
+
+def extract(card, city):
+    """
+    Принимает:
+    карточку вакансии,
+    город.
+
+    Возвращает:
+    Vacancy с информацией о вакансии.
+    """
+    salary_from, salary_to, curr = get_salary(SALARY(card)[0].text)
+    return Vacancy(
+        vacancy_id=get_vacancy_id(card),
+        salary_from=salary_from,
+        salary_to=salary_to,
+        curr=curr,
+        areas=city,
+        url=get_vacancy_url(card),
+        description=get_description(card),
+        company=get_company_name(card),
+        title=get_title(card),
+        format=None,
+        date=get_date(card),
+    )
+
+
+def get_vacancy_id(card):
+    parent = card.getparent()
+    return int(parent.attrib['data-key'].split(':')[0])
+
+
+def get_salary(salary):
+    if 'договорная зарплата' in salary:
+        return 0, 0, 'RUB'
+    salary = salary.replace('\xa0', ' ')
+    salary_split = salary.split('—')
+    if len(salary_split) == 2:
+        salary_from = int(salary_split[0].replace(' ', ''))
+        salary_split = salary_split[1].split()
+        salary_to = int(salary_split[0] + salary_split[1])
+    else:
+        if 'от' in str(salary):
+            salary = salary.replace('руб.', '').split('от')
+            salary_from = int(salary[1].replace(' ', ''))
+            salary_to = 0
+        elif 'до' in str(salary):
+            salary = salary.replace('руб.', '').split('до')
+            salary_to = int(salary[1].replace(' ', ''))
+            salary_from = 0
+        else:
+            salary_to = salary.replace('руб.', '').replace(' ', '')
+            salary_from = 0
+    curr = 'RUB'
+    return salary_from, salary_to, curr
+
+
+def get_vacancy_url(card):
+    return SITE_URL + TITLE(card)[0].attrib['href']
+
+
+def get_description(card):
+    element = first(DESCRIPTION, card)
+    return element.text if element is not None else None
+
+
+def get_company_name(card):
+    element = first(COMPANY, card)
+    return element.text if element is not None else None
+
+
+def get_title(card):
+    return TITLE(card)[0].text
+
+
+def get_city(element):
+    return LOCATION(element)[0].getnext().text
+
+
+def get_date(card):
+    vacancy_date = DATE_POSTED(card)[0].attrib['content']
+    date_strip = vacancy_date.split('.')
+    return datetime.strptime(date_strip[0], '%Y-%m-%dT%H:%M:%S')
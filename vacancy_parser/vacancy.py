@@ -0,0 +1,41 @@
+from collections import namedtuple
+from hashlib import blake2b
+from operator import attrgetter
+
+
+# Информация об одной вакансии в порядке колонок таблицы vacancies.
+# Кортеж без словаря атрибутов: пакет из сотни вакансий занимает меньше памяти,
+# чем ответ API, из которого он получен, а поля доступны и по имени, и по индексу
+# (DataBase.write_many передает их в execute_values, добавив хеш содержимого).
+Vacancy = namedtuple('Vacancy', (
+    'vacancy_id',  # id вакансии на сайте источника
+    'salary_from',  # зарплата от
+    'salary_to',  # зарплата до
+    'curr',  # валюта зарплаты
+    'areas',  # город, в котором размещена вакансия
+    'url',  # url вакансии
+    'description',  # краткое описание вакансии
+    'company',  # наименование компании, разместившей вакансию
+    'title',  # наименование вакансии
+    'format',  # формат работы (удаленно, в офисе)
+    'date',  # дата размещения вакансии
+))
+
+# Поля, которые источник может изменить у уже размещенной вакансии.
+# id, url и дата размещения в них не входят: они определяют саму вакансию.
+CONTENT_FIELDS = ('salary_from', 'salary_to', 'curr', 'areas', 'description', 'company', 'title', 'format')
+
+_content = attrgetter(*CONTENT_FIELDS)
+
+
+def content_hash(record):
+    """
+    Принимает:
+    Vacancy.
+
+    Возвращает:
+    8-байтовый хеш полей CONTENT_FIELDS (целое со знаком, как BIGINT в PostgreSQL).
+    Хеш меняется, только если изменилась зарплата, описание, формат работы и т.п.
+    """
+    text = '\x1f'.join('' if value is None else str(value) for value in _content(record))
+    return int.from_bytes(blake2b(text.encode(), digest_size=8).digest(), 'big', signed=True)
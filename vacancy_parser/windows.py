@@ -0,0 +1,158 @@
+import math
+from datetime import timedelta
+
+
+class WindowPlanner:
+    """
+    Адаптивное разбиение периода поиска на временные окна.
+
+    Принимает:
+    функцию-пробу (корутина от начала и конца окна, возвращает кортеж из количества
+    найденных вакансий и первой страницы ответа либо None, если запрос не удался),
+    функцию выгрузки окна (корутина от начала, конца окна, количества вакансий и первой страницы),
+    ограничение API на количество результатов одного поиска,
+    количество результатов на странице,
+    минимальную и максимальную длину окна в минутах,
+    логгер.
+
+    Назначение:
+    покрыть весь период окнами, в каждом из которых вакансий не больше ограничения API,
+    сделав как можно меньше запросов.
+
+    Период делится на крупные окна длиной max_interval, поэтому малонаполненные
+    (например, ночные) отрезки выгружаются одним окном вместо десятка фиксированных.
+    Окно, в котором вакансий больше ограничения, делится на части пропорционально
+    количеству вакансий; части обрабатываются так же, пока не уложатся в ограничение
+    или не достигнут минимальной длины.
+
+    Планировщик не создает задач: окна и их части обрабатывает фиксированное
+    количество обработчиков конвейера (см. Parser.parse_windows).
+    """
+
+    fill_ratio = 0.8  # целевая заполненность окна после деления, с запасом на неравномерность
+
+    def __init__(self, probe, fetch, cap, per_page, min_interval, max_interval, logger=None):
+        self.probe = probe
+        self.fetch = fetch
+        self.cap = cap
+        self.per_page = per_page
+        self.min_interval = timedelta(minutes=min_interval)
+        self.max_interval = timedelta(minutes=max_interval)
+        self.logger = logger
+        self.stats = {
+            'probes': 0,  # запросы для подсчета вакансий в окне
+            'splits': 0,  # количество делений окон
+            'windows': 0,  # окна, выгруженные целиком
+            'pages': 0,  # страницы в выгружаемых окнах
+            'overflow': 0,  # вакансии, не поместившиеся в окна минимальной длины
+            'failed': 0,  # окна, для которых не удалось получить количество вакансий
+        }
+        self.failed = []  # окна (начало, конец), для которых не удалось получить количество вакансий
+
+    def windows(self, time_from, time_to):
+        """
+        Принимает:
+        начало и конец периода поиска.
+
+        Возвращает:
+        генератор окон максимальной длины (начало, конец), покрывающих период.
+        Окна обрабатываются методом process по мере того, как их берут обработчики
+        (см. Parser.parse_windows), а не все сразу.
+        """
+        while time_from < time_to:
+            window_to = min(time_from + self.max_interval, time_to)
+            yield time_from, window_to
+            time_from = window_to
+
+    async def process(self, time_from, time_to):
+        """
+        Принимает:
+        начало и конец окна.
+
+        Назначение:
+        получить количество вакансий в окне и либо передать окно на выгрузку,
+        либо поделить его на части.
+
+        Возвращает:
+        список частей окна (начало, конец), которые нужно обработать этим же методом,
+        пустой, если окно передано на выгрузку или его не удалось получить.
+        """
+        self.stats['probes'] += 1
+        result = await self.probe(time_from, time_to)
+        if result is None:
+            self.stats['failed'] += 1
+            self.failed.append((time_from, time_to))
+            return []
+        found, first_page = result
+        span = time_to - time_from
+        if found > self.cap and span > self.min_interval:
+            self.stats['splits'] += 1
+            del first_page, result  # первая страница окна, которое будет поделено, не понадобится
+            parts = max(2, math.ceil(found / (self.cap * self.fill_ratio)))
+            return split_period(time_from, time_to, max(span / parts, self.min_interval))
+        if found > self.cap:
+            self.stats['overflow'] += found - self.cap
+            if self.logger:
+                self.logger.error('More than %s vacancies from %s to %s, %s', self.cap, time_from, time_to, found)
+        self.stats['windows'] += 1
+        # первая страница уже получена пробой, остальные будут запрошены при выгрузке
+        self.stats['pages'] += max(math.ceil(min(found, self.cap) / self.per_page) - 1, 0)
+        # ссылку на первую страницу держит только выгрузка, которая освобождает ее после разбора
+        fetch = self.fetch(time_from, time_to, found, first_page)
+        del first_page, result
+        await fetch
+        return []
+
+    def report(self, time_from, time_to, fixed_interval, executed=None):
+        """
+        Принимает:
+        начало и конец периода,
+        длину фиксированного окна в минутах, с которой сравнивается план,
+        фактическое количество выполненных запросов.
+
+        Возвращает:
+        строку с количеством запланированных и выполненных запросов.
+        """
+        fixed = math.ceil((time_to - time_from) / timedelta(minutes=fixed_interval))
+        planned = self.stats['probes'] + self.stats['pages']
+        stats = ', '.join(f'{key}={value}' for key, value in self.stats.items())
+        return (f'Windows from {time_from} to {time_to}: planned requests {planned}, '
+                f'executed {executed if executed is not None else "-"}, '
+                f'fixed {fixed_interval}-minute windows would need {fixed}+ ({stats})')
+
+
+def split_period(time_from, time_to, interval):
+    """
+    Принимает:
+    начало и конец периода,
+    длину части (timedelta).
+
+    Возвращает:
+    список частей периода (начало, конец); последняя часть может быть короче.
+    """
+    parts = []
+    while time_from < time_to:
+        part_to = min(time_from + interval, time_to)
+        parts.append((time_from, part_to))
+        time_from = part_to
+    return parts
+
+
+def grid_windows(time_from, time_to, interval):
+    """
+    Принимает:
+    начало и конец периода,
+    длину окна (timedelta), на которую делятся сутки.
+
+    Возвращает:
+    окна сетки, кратной interval от начала суток, которые целиком закончились
+    к концу периода. Одно и то же время всегда попадает в одно и то же окно,
+    поэтому окна разных запусков совпадают и не дублируются в очереди.
+    """
+    day = time_from.replace(hour=0, minute=0, second=0, microsecond=0)
+    window_from = day + (time_from - day) // interval * interval
+    windows = []
+    while window_from + interval <= time_to:
+        windows.append((window_from, window_from + interval))
+        window_from += interval
+    return windows